@@ -0,0 +1,497 @@
+import ast
+import builtins
+import hashlib
+import math
+import textwrap
+
+import numpy as np
+
+
+# Векторизация циклов без зависимостей между итерациями:
+#     for i in range(1, n):
+#         a[i] = b[i] + c[i - 1]
+# превращается в a[1:n] = b[1:n] + c[0:n - 1].
+# Поддерживаются идеально вложенные циклы по range, аффинные индексы i + k
+# (a[i][j] и a[i, j] для гнёзд), временные переменные, арифметика,
+# сравнения, x if c else y и функции из NUMPY_FUNCTIONS. Если анализ не
+# прошёл или индексы выходят за границы массивов, выполняется исходный
+# цикл. Списки на время векторного прогона переводятся в массивы NumPy;
+# если целые в них могут выйти за int64, массивы берутся с dtype=object
+# (точная арифметика Python). Ошибки арифметики (деление на ноль и т. п.)
+# тоже переводят на исходный цикл, он и выбросит исключение.
+
+NUMPY_FUNCTIONS = {
+    "abs": "np.abs",
+    "min": "np.minimum",
+    "max": "np.maximum",
+    "math.sqrt": "np.sqrt",
+    "math.exp": "np.exp",
+    "math.log": "np.log",
+    "math.sin": "np.sin",
+    "math.cos": "np.cos",
+}
+
+_ALLOWED_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_ALLOWED_UNARYOPS = (ast.UAdd, ast.USub)
+
+_CACHE = {}  # sha256 исходника -> VectorizedLoop
+
+INT64_BOUND = 2 ** 63 - 1
+
+
+class _Fallback(Exception):
+    # векторный прогон невозможен для этих данных, до каких-либо записей
+    pass
+
+
+def _check(arr, dims, bounds):
+    if not isinstance(arr, np.ndarray) or arr.ndim != dims:
+        raise _Fallback
+    for size, (lo, hi) in zip(arr.shape, bounds):
+        if lo < 0 or hi >= size:
+            raise _Fallback
+
+
+def _store(env, name, index, value, widen, regions):
+    # Запись блока; массив из списка расширяется до типа значения
+    # (список мог хранить что угодно), массив NumPy — нет, как и в цикле.
+    # regions запоминает записанную область для обратного копирования
+    regions[name] = index if isinstance(index, tuple) else (index,)
+    arr = env[name]
+    if name in widen:
+        dtype = np.result_type(arr, value)
+        if dtype != arr.dtype:
+            arr = arr.astype(dtype)
+            env[name] = arr
+    arr[index] = value
+    return arr
+
+
+def _write_back(target, arr, index):
+    # в список возвращается только записанная циклом область, остальные
+    # элементы сохраняют свои объекты (и типы)
+    if arr.ndim == 1:
+        target[index[0]] = arr[index[0]].tolist()
+    else:
+        for r in range(*index[0].indices(len(arr))):
+            _write_back(target[r], arr[r], index[1:])
+
+
+def _magnitude(node, bounds, peak):
+    # Оценка сверху |значения| выражения -> (оценка, целое ли). bounds:
+    # имя -> (оценка, целое ли); в peak[0] — максимум по целым подвыражениям
+    if isinstance(node, ast.Constant):
+        result = (abs(node.value), type(node.value) is int)
+    elif isinstance(node, ast.Name):
+        result = bounds.get(node.id, (math.inf, False))
+    elif isinstance(node, ast.Subscript):
+        while isinstance(node, ast.Subscript):
+            node = node.value
+        result = bounds.get(node.id, (math.inf, False))
+    elif isinstance(node, ast.UnaryOp):
+        result = _magnitude(node.operand, bounds, peak)
+    elif isinstance(node, ast.Compare):
+        for child in [node.left, *node.comparators]:
+            _magnitude(child, bounds, peak)
+        result = (1, True)
+    elif isinstance(node, ast.IfExp):
+        _magnitude(node.test, bounds, peak)
+        (a, a_int), (b, b_int) = (_magnitude(node.body, bounds, peak),
+                                  _magnitude(node.orelse, bounds, peak))
+        result = (max(a, b), a_int and b_int)
+    elif isinstance(node, ast.Call):
+        args = [_magnitude(a, bounds, peak) for a in node.args]
+        if ast.unparse(node.func) in ("abs", "min", "max"):
+            result = (max(a for a, _ in args), all(i for _, i in args))
+        else:
+            result = (math.inf, False)
+    else:
+        (a, a_int), (b, b_int) = (_magnitude(node.left, bounds, peak),
+                                  _magnitude(node.right, bounds, peak))
+        is_int = a_int and b_int and not isinstance(node.op, ast.Div)
+        if isinstance(node.op, (ast.Add, ast.Sub)):
+            bound = a + b
+        elif isinstance(node.op, ast.Mult):
+            bound = a * b
+        elif isinstance(node.op, ast.Pow):
+            bound = a ** b
+        elif isinstance(node.op, ast.FloorDiv):
+            bound = a + 1
+        elif isinstance(node.op, ast.Mod):
+            bound = b
+        else:
+            bound = math.inf
+        result = (bound, is_int)
+    if result[1]:
+        peak[0] = max(peak[0], result[0])
+    return result
+
+
+def _int_peak(nest, body, env):
+    # максимум |целого| по всем подвыражениям тела для данных env
+    bounds = {}
+    for name, value in env.items():
+        if isinstance(value, np.ndarray):
+            if value.dtype.kind in "biu" and value.size:
+                bounds[name] = (max(abs(int(value.min())), abs(int(value.max()))), True)
+            elif value.dtype.kind in "biu":
+                bounds[name] = (0, True)
+            elif value.dtype == object:
+                bounds[name] = (math.inf, True)
+            else:
+                bounds[name] = (math.inf, False)
+        elif isinstance(value, (bool, int)):
+            bounds[name] = (abs(value), True)
+    for var, args in nest:
+        r = range(*[eval(compile(ast.Expression(a), "<range>", "eval"), {}, dict(env))
+                    for a in args])
+        bounds[var] = (max(abs(r.start), abs(r.stop)), True)
+
+    peak = [0]
+    for stmt in body:
+        target = stmt.target if isinstance(stmt, ast.AugAssign) else stmt.targets[0]
+        value = stmt.value
+        if isinstance(stmt, ast.AugAssign):
+            value = ast.BinOp(left=target, op=stmt.op, right=value)
+        bound = _magnitude(value, bounds, peak)
+        while isinstance(target, ast.Subscript):
+            target = target.value
+        old_bound, old_int = bounds.get(target.id, (0, True))
+        bounds[target.id] = (max(old_bound, bound[0]), old_int and bound[1])
+    return peak[0]
+
+
+def _shift(base, k):
+    # "i", 1 -> "i + 1"; "i", -1 -> "i - 1"
+    if k == 0:
+        return base
+    return f"{base} + {k}" if k > 0 else f"{base} - {-k}"
+
+
+def _affine(node, loop_vars):
+    # i, i + k, i - k, k + i -> (i, k)
+    if isinstance(node, ast.Name) and node.id in loop_vars:
+        return node.id, 0
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)):
+        def const(x):
+            return isinstance(x, ast.Constant) and type(x.value) is int
+        sign = 1 if isinstance(node.op, ast.Add) else -1
+        if const(node.right):
+            var, k = _affine(node.left, loop_vars)
+            return var, k + sign * node.right.value
+        if const(node.left) and sign == 1:
+            var, k = _affine(node.right, loop_vars)
+            return var, k + node.left.value
+    raise ValueError(f"индекс {ast.unparse(node)} не вида i + k")
+
+
+def _parse_access(node, loop_vars):
+    # a[i][j] или a[i, j] -> ("a", [("i", 0), ("j", 0)])
+    indices = []
+    while isinstance(node, ast.Subscript):
+        parts = node.slice.elts if isinstance(node.slice, ast.Tuple) else [node.slice]
+        indices[:0] = [_affine(p, loop_vars) for p in parts]
+        node = node.value
+    if not isinstance(node, ast.Name):
+        raise ValueError(f"обращение {ast.unparse(node)} не к массиву по имени")
+
+    order = [loop_vars.index(var) for var, _ in indices]
+    if order != sorted(set(order)) or len(order) != len(indices):
+        raise ValueError(f"индексы {node.id} идут не в порядке вложенности циклов")
+    return node.id, indices
+
+
+def _parse_nest(loop):
+    # идеально вложенные for v in range(...) -> [(v, args)], тело
+    nest = []
+    while True:
+        header = loop.iter
+        if not (isinstance(loop.target, ast.Name) and not loop.orelse
+                and isinstance(header, ast.Call) and isinstance(header.func, ast.Name)
+                and header.func.id == "range" and 1 <= len(header.args) <= 3
+                and not header.keywords):
+            raise ValueError("ожидается цикл вида: for i in range(k, n):")
+        outer = {var for var, _ in nest}
+        for arg in header.args:
+            if any(isinstance(x, ast.Name) and x.id in outer for x in ast.walk(arg)):
+                raise ValueError("границы внутреннего цикла зависят от внешнего")
+        nest.append((loop.target.id, header.args))
+
+        if len(loop.body) == 1 and isinstance(loop.body[0], ast.For):
+            loop = loop.body[0]
+        else:
+            return nest, loop.body
+
+
+class _Translator(ast.NodeTransformer):
+    # выражение тела цикла -> выражение над срезами
+    def __init__(self, loop_vars, arrays, assigned):
+        self.loop_vars = loop_vars
+        self.arrays = arrays
+        self.assigned = assigned   # имена, которым тело присваивает значения
+        self.temps = set()         # ... из них уже получившие значение
+        self.accesses = []
+        self.names = set()         # внешние скаляры и переменные цикла
+
+    def slices(self, indices):
+        by_var = dict(indices)
+        parts = [f"{_shift(f'_s{d}', by_var[v])}:{_shift(f'_l{d}', by_var[v] + 1)}:_st{d}"
+                 for d, v in enumerate(self.loop_vars) if v in by_var]
+        return ", ".join(parts)
+
+    def align(self, used):
+        # оси для переменных, которых нет в индексе, — None для broadcasting
+        if len(used) == len(self.loop_vars):
+            return ""
+        return "[" + ", ".join(":" if v in used else "None" for v in self.loop_vars) + "]"
+
+    def visit_Subscript(self, node):
+        name, indices = _parse_access(node, self.loop_vars)
+        self.accesses.append((name, indices))
+        used = [var for var, _ in indices]
+        return ast.parse(f"{name}[{self.slices(indices)}]{self.align(used)}", mode="eval").body
+
+    def visit_Name(self, node):
+        if node.id in self.arrays:
+            raise ValueError(f"массив {node.id} используется без индекса")
+        if node.id in self.assigned and node.id not in self.temps:
+            # чтение до присваивания в итерации — значение из прошлой итерации
+            raise ValueError(f"{node.id} переносит значение между итерациями")
+        if node.id not in self.temps:
+            self.names.add(node.id)
+        return node
+
+    def visit_Call(self, node):
+        name = ast.unparse(node.func)
+        if name not in NUMPY_FUNCTIONS or node.keywords:
+            raise ValueError(f"вызов {name} не векторизуется")
+        if name in ("min", "max") and len(node.args) != 2:
+            raise ValueError(f"{name} векторизуется только с двумя аргументами")
+        node.func = ast.parse(NUMPY_FUNCTIONS[name], mode="eval").body
+        node.args = [self.visit(a) for a in node.args]
+        return node
+
+    def visit_IfExp(self, node):
+        args = [self.visit(node.test), self.visit(node.body), self.visit(node.orelse)]
+        return ast.Call(func=ast.parse("np.where", mode="eval").body, args=args, keywords=[])
+
+    def visit_Compare(self, node):
+        if len(node.ops) != 1:
+            raise ValueError("цепочки сравнений не векторизуются")
+        return self.generic_visit(node)
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _ALLOWED_BINOPS):
+            raise ValueError(f"операция {type(node.op).__name__} не векторизуется")
+        if isinstance(node.op, ast.Pow) and not (
+                isinstance(node.right, ast.Constant) and type(node.right.value) is int
+                and node.right.value >= 0):
+            raise ValueError("степень векторизуется только с целым показателем >= 0")
+        return self.generic_visit(node)
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, _ALLOWED_UNARYOPS):
+            raise ValueError(f"операция {type(node.op).__name__} не векторизуется")
+        return self.generic_visit(node)
+
+    def visit_Constant(self, node):
+        if type(node.value) not in (int, float):
+            raise ValueError(f"константа {node.value!r} не число")
+        return node
+
+    def generic_visit(self, node):
+        allowed = (ast.BinOp, ast.UnaryOp, ast.Compare, ast.expr_context,
+                   ast.operator, ast.unaryop, ast.cmpop)
+        if not isinstance(node, allowed):
+            raise ValueError(f"конструкция {type(node).__name__} не векторизуется")
+        return super().generic_visit(node)
+
+
+def _generate(tree):
+    # -> (исходник функции _loop, массивы, записываемые массивы)
+    if len(tree.body) != 1 or not isinstance(tree.body[0], ast.For):
+        raise ValueError("ожидается ровно один цикл for")
+    nest, body = _parse_nest(tree.body[0])
+    loop_vars = [var for var, _ in nest]
+
+    arrays, assigned = set(), set()
+    for stmt in body:
+        if not (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1
+                or isinstance(stmt, ast.AugAssign)):
+            raise ValueError(f"оператор {type(stmt).__name__} не векторизуется")
+        target = stmt.target if isinstance(stmt, ast.AugAssign) else stmt.targets[0]
+        if isinstance(target, ast.Name):
+            assigned.add(target.id)
+        elif not isinstance(target, ast.Subscript):
+            raise ValueError(f"запись в {ast.unparse(target)} не векторизуется")
+        for node in ast.walk(stmt):
+            if isinstance(node, ast.Subscript):
+                arrays.add(_parse_access(node, loop_vars)[0])
+    if assigned & (arrays | set(loop_vars)):
+        raise ValueError(f"присваивание {sorted(assigned & (arrays | set(loop_vars)))} целиком")
+
+    translator = _Translator(loop_vars, arrays, assigned)
+    writes = {}
+    lines = []
+    for stmt in body:
+        augmented = isinstance(stmt, ast.AugAssign)
+        target = stmt.target if augmented else stmt.targets[0]
+        value = translator.visit(stmt.value)
+        if augmented:
+            # a[i] += v -> a[i] = a[i] + v; для скаляра чтение до записи
+            # отловит visit_Name
+            load = ast.parse(ast.unparse(target), mode="eval").body
+            value = ast.BinOp(left=translator.visit(load), op=stmt.op, right=value)
+        value = ast.unparse(value)
+
+        if isinstance(target, ast.Name):
+            translator.temps.add(target.id)
+            lines.append(f"{target.id} = {value}")
+            continue
+
+        name, indices = _parse_access(target, loop_vars)
+        if [var for var, _ in indices] != loop_vars:
+            raise ValueError(f"запись в {name} должна использовать все переменные цикла")
+        translator.accesses.append((name, indices))
+        writes[name] = indices
+        index = translator.slices(indices)
+        lines.append(f"{name} = _store(_env, {name!r}, np.s_[{index}], {value}, _widen, _regions)")
+
+    # зависимость между итерациями: записываемый массив читается
+    # или пишется с другим смещением
+    for name, indices in translator.accesses:
+        if name in writes and indices != writes[name]:
+            raise ValueError(f"зависимость по массиву {name}: {name}{_index_text(indices)} "
+                             f"и {name}{_index_text(writes[name])}")
+
+    bare_vars = [var for var in loop_vars if var in translator.names]
+    free = (translator.names - set(loop_vars)) | arrays
+    for _, args in nest:
+        free.update(x.id for arg in args for x in ast.walk(arg)
+                    if isinstance(x, ast.Name) and not hasattr(builtins, x.id))
+
+    src = ["def _loop(_env, _widen, _regions):"]
+    src += [f"    {name} = _env[{name!r}]" for name in sorted(free)]
+    for d, (_, args) in enumerate(nest):
+        src.append(f"    _r{d} = range({', '.join(ast.unparse(a) for a in args)})")
+        src.append(f"    if len(_r{d}) == 0:")
+        src.append("        return")
+        src.append(f"    if _r{d}.step < 0:")
+        src.append("        raise _Fallback")
+        src.append(f"    _s{d}, _l{d}, _st{d} = _r{d}.start, _r{d}[-1], _r{d}.step")
+
+    # границы проверяются до первой записи: при выходе за массив
+    # (в том числе отрицательные индексы) выполняется исходный цикл
+    checked = set()
+    for name, indices in translator.accesses:
+        if (name, tuple(indices)) in checked:
+            continue
+        checked.add((name, tuple(indices)))
+        by_var = dict(indices)
+        bounds = [f"({_shift(f'_s{d}', by_var[v])}, {_shift(f'_l{d}', by_var[v])})"
+                  for d, v in enumerate(loop_vars) if v in by_var]
+        src.append(f"    _check({name}, {len(indices)}, ({', '.join(bounds)},))")
+
+    for var in bare_vars:
+        d = loop_vars.index(var)
+        src.append(f"    {var} = np.arange(_s{d}, _l{d} + 1, _st{d}){translator.align([var])}")
+    src += [f"    {line}" for line in lines]
+    return "\n".join(src) + "\n", sorted(arrays), sorted(writes)
+
+
+def _index_text(indices):
+    return "[" + ", ".join(_shift(var, k) for var, k in indices) + "]"
+
+
+class VectorizedLoop:
+    # Скомпилированный цикл. Вызов loop(n=n, a=a, b=b, ...) выполняет его
+    # над переданными переменными на месте, как исходный цикл.
+    # vectorized — удалось ли построить векторную версию, reason — почему нет
+    def __init__(self, source: str):
+        self.source = textwrap.dedent(source).strip() + "\n"
+        self.generated = None
+        self.reason = None
+        self.arrays = []
+        self.writes = []
+        self._loop = None
+        self._original = compile(self.source, "<loop>", "exec")
+
+        try:
+            self.generated, self.arrays, self.writes = _generate(ast.parse(self.source))
+        except ValueError as e:
+            self.reason = str(e)
+            return
+        # _generate переписывает дерево, для оценки диапазона нужно исходное
+        self._nest, self._body = _parse_nest(ast.parse(self.source).body[0])
+
+        namespace = {"np": np, "_check": _check, "_store": _store, "_Fallback": _Fallback}
+        exec(compile(self.generated, "<vectorized loop>", "exec"), namespace)
+        self._loop = namespace["_loop"]
+
+    @property
+    def vectorized(self) -> bool:
+        return self._loop is not None
+
+    def __call__(self, **env):
+        if self._loop is not None and self._run_vectorized(env):
+            return
+        exec(self._original, {"math": math, "np": np, **env})
+
+    def _run_vectorized(self, env) -> bool:
+        # один и тот же объект под двумя именами, один из которых
+        # записывается, — скрытая зависимость, векторный прогон неверен
+        for name in self.writes:
+            for other in self.arrays:
+                if other != name and (env[other] is env[name] or (
+                        isinstance(env[name], np.ndarray) and isinstance(env[other], np.ndarray)
+                        and np.may_share_memory(env[name], env[other]))):
+                    return False
+
+        # записываемые массивы NumPy тоже копируются: при ошибке посреди
+        # прогона исходный цикл должен начать с нетронутых данных
+        local_env = dict(env)
+        lists = [name for name in self.arrays if not isinstance(env[name], np.ndarray)]
+        try:
+            # рваные вложенные списки в массив не переводятся
+            for name in self.arrays:
+                local_env[name] = np.asarray(env[name])
+            for name in self.writes:
+                if name not in lists:
+                    local_env[name] = local_env[name].copy()
+        except (TypeError, ValueError):
+            return False
+
+        # целые из списков в Python не переполняются: если оценка диапазона
+        # выходит за int64, считаем на объектах Python
+        if any(local_env[name].dtype.kind in "biu" for name in lists):
+            try:
+                peak = _int_peak(self._nest, self._body, local_env)
+            except (ArithmeticError, TypeError, ValueError, KeyError):
+                return False
+            if peak > INT64_BOUND:
+                for name in lists:
+                    if local_env[name].dtype.kind in "biu":
+                        local_env[name] = np.array(env[name], dtype=object)
+
+        widen = set(self.writes) & set(lists)
+        regions = {}
+        try:
+            with np.errstate(divide="raise", over="raise", invalid="raise"):
+                self._loop(local_env, widen, regions)
+        except (_Fallback, ArithmeticError, TypeError, ValueError):
+            return False
+
+        for name, index in regions.items():
+            if name in widen:
+                _write_back(env[name], local_env[name], index)
+            else:
+                env[name][index] = local_env[name][index]
+        return True
+
+
+def vectorize_loop(source: str) -> VectorizedLoop:
+    # Компиляции кэшируются по хэшу исходника
+    key = hashlib.sha256(textwrap.dedent(source).strip().encode("utf-8")).hexdigest()
+    if key not in _CACHE:
+        _CACHE[key] = VectorizedLoop(source)
+    return _CACHE[key]
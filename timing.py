@@ -0,0 +1,140 @@
+import gc
+import math
+import os
+import statistics
+import time
+
+
+# Общий инструмент замеров для всех практик: прогрев, отключение GC,
+# привязка к ядру и повторы до тех пор, пока доверительный интервал
+# медианы не станет достаточно узким.
+#
+# Скрипты практик лежат во вложенных каталогах и подключают этот модуль
+# (и loop_vectorizer) из корня репозитория строкой
+#     sys.path.insert(0, str(Path(__file__).resolve().parents[N]))
+# где N — глубина скрипта, поэтому запускаются из любого каталога.
+
+DEFAULTS = {
+    "warmup": 1,
+    "min_repeats": 5,
+    "max_repeats": 50,
+    "rel_ci": 0.05,        # полуширина 95% ДИ медианы относительно медианы
+    "max_seconds": 5.0,    # бюджет на один замер (без прогрева)
+    "disable_gc": True,
+    "cpu": None,           # номер ядра для привязки, None — не привязывать
+}
+
+
+def configure(**options) -> None:
+    unknown = set(options) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"unknown timing options: {sorted(unknown)}")
+    DEFAULTS.update(options)
+
+
+def median_ci(samples: list[float], z: float = 1.96) -> tuple[float, float]:
+    # Непараметрический ДИ медианы по порядковым статистикам:
+    # ранги n/2 -+ z*sqrt(n)/2
+    data = sorted(samples)
+    n = len(data)
+    half = z * math.sqrt(n) / 2
+    lo = max(0, int(math.floor(n / 2 - half)))
+    hi = min(n - 1, int(math.ceil(n / 2 + half)) - 1)
+    return data[lo], data[hi]
+
+
+def summarize(samples: list[float]) -> dict:
+    if len(samples) >= 2:
+        q1, _, q3 = statistics.quantiles(samples, n=4)
+    else:
+        q1 = q3 = samples[0]
+    ci_low, ci_high = median_ci(samples)
+    return {
+        "best": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "q1": q1,
+        "q3": q3,
+        "iqr": q3 - q1,
+        "ci_low": ci_low,
+        "ci_high": ci_high,
+        "repeats": len(samples),
+    }
+
+
+def _pin_cpu(cpu):
+    if cpu is None or not hasattr(os, "sched_setaffinity"):
+        return None
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, {cpu})
+    return previous
+
+
+def benchmark(fn, *args, **kwargs) -> dict:
+    # Параметры замера берутся из DEFAULTS; переопределить на один вызов
+    # можно через timing_options={...}. В словаре результата также лежат
+    # samples (все замеры) и result (значение последнего вызова fn)
+    opts = dict(DEFAULTS)
+    opts.update(kwargs.pop("timing_options", {}))
+
+    previous_affinity = _pin_cpu(opts["cpu"])
+    gc_was_enabled = gc.isenabled()
+    samples = []
+    try:
+        if opts["disable_gc"]:
+            gc.collect()
+            gc.disable()
+
+        # прогрев: кэши, ленивые импорты, запуск пулов
+        warmup_time = None
+        for _ in range(opts["warmup"]):
+            t0 = time.perf_counter()
+            result = fn(*args, **kwargs)
+            warmup_time = time.perf_counter() - t0
+
+        # долгие функции не повторяем сверх бюджета
+        spent = 0.0
+        if warmup_time is not None and warmup_time >= opts["max_seconds"]:
+            samples.append(warmup_time)
+            spent = warmup_time
+
+        while not samples or len(samples) < opts["max_repeats"]:
+            if samples and spent >= opts["max_seconds"]:
+                break
+
+            t0 = time.perf_counter()
+            result = fn(*args, **kwargs)
+            dt = time.perf_counter() - t0
+            samples.append(dt)
+            spent += dt
+
+            if len(samples) >= opts["min_repeats"]:
+                median = statistics.median(samples)
+                ci_low, ci_high = median_ci(samples)
+                if median > 0 and (ci_high - ci_low) / 2 <= opts["rel_ci"] * median:
+                    break
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+        if previous_affinity is not None:
+            os.sched_setaffinity(0, previous_affinity)
+
+    stats = summarize(samples)
+    stats["samples"] = samples
+    stats["result"] = result
+    return stats
+
+
+def measure(func, *args, **kwargs):
+    # Совместимо с measure() из практик: (результат, время в секундах),
+    # только время — медиана устойчивого замера, а не один прогон
+    stats = benchmark(func, *args, **kwargs)
+    return stats["result"], stats["median"]
+
+
+def format_stats(stats: dict, unit: str = "sec", scale: float = 1.0) -> str:
+    # "медиана (IQR, 95% ДИ медианы)"; scale переводит секунды в unit
+    return (f"{stats['median'] * scale:.4f} {unit} "
+            f"(IQR {stats['iqr'] * scale:.4f}, "
+            f"95% CI [{stats['ci_low'] * scale:.4f}, {stats['ci_high'] * scale:.4f}])")
@@ -1,8 +1,12 @@
-import time
 import random
+import sys
+from pathlib import Path
 from threading import Thread, Lock
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import timing
+
 def sequential_sum(arr):
     return sum(arr)
 
@@ -47,9 +51,8 @@ for size in sizes:
     array = [random.randint(1, 10) for _ in range(size)]
 
     # последовательная версия
-    start = time.perf_counter()
-    seq_res = sequential_sum(array)
-    time_seq = (time.perf_counter() - start) * 1000
+    seq_res, time_seq = timing.measure(sequential_sum, array)
+    time_seq *= 1000
 
     print(f"Последовательная версия: {time_seq:.2f} ms")
 
@@ -60,9 +63,8 @@ for size in sizes:
 
     # параллельные версии
     for n in threads_to_test:
-        start = time.perf_counter()
-        par_res = parallel_sum(array, n)
-        time_par = (time.perf_counter() - start) * 1000
+        par_res, time_par = timing.measure(parallel_sum, array, n)
+        time_par *= 1000
 
         if par_res != seq_res:
             print(f"⚠ Ошибка: суммы не совпадают для {n} потоков!")
@@ -1,5 +1,10 @@
-import time
 from threading import Thread, Lock
+from concurrent.futures import ProcessPoolExecutor
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import timing
 def sequential_chain(n):
     result = 1
     for i in range(n):
@@ -41,24 +46,87 @@ def parallel_chain(n, num_threads):
     return parallel_result
 
 
+# r -> (a*r + b) mod m — аффинное отображение, а композиция аффинных
+# отображений снова аффинна. Отображение храним как пару (a, b)
+MOD = 1000000
+STEP = (2, 1)
+
+
+def affine_compose(f, g, m=MOD):
+    # сначала f, потом g: g(f(r)) = g.a * (f.a * r + f.b) + g.b
+    return (g[0] * f[0]) % m, (g[0] * f[1] + g[1]) % m
+
+
+def affine_power(f, n, m=MOD):
+    # f применённое n раз, за O(log n) композиций
+    result = (1, 0)
+    while n > 0:
+        if n & 1:
+            result = affine_compose(result, f, m)
+        f = affine_compose(f, f, m)
+        n >>= 1
+    return result
+
+
+def jump_chain(n, r0=1, step=STEP, m=MOD):
+    # то же, что sequential_chain(n), но за O(log n) — годится и для n ~ 1e9
+    a, b = affine_power(step, n, m)
+    return (a * r0 + b) % m
+
+
+def chain_chunk_transform(args):
+    # композиция шагов одного куска — работа, которая делается параллельно;
+    # шаг постоянный, поэтому это степень отображения, O(log length)
+    length, step, m = args
+    return affine_power(step, length, m)
+
+
+def parallel_chain_scan(n, num_workers, r0=1, step=STEP, m=MOD):
+    # 1) каждый процесс сворачивает свой кусок в одно отображение (a, b);
+    # 2) префиксный скан по кускам даёт значение на границе каждого куска;
+    # 3) последнее значение совпадает с sequential_chain(n)
+    chunk = n // num_workers
+    lengths = [chunk] * (num_workers - 1) + [n - chunk * (num_workers - 1)]
+
+    with ProcessPoolExecutor(max_workers=num_workers) as ex:
+        transforms = list(ex.map(chain_chunk_transform, [(L, step, m) for L in lengths]))
+
+    prefix = [r0 % m]
+    for a, b in transforms:
+        prefix.append((a * prefix[-1] + b) % m)
+
+    return prefix[-1]
+
+
 def measure(func, *args):
-    start = time.perf_counter()
-    res = func(*args)
-    elapsed = (time.perf_counter() - start) * 1000
-    return res, elapsed
-
-N = 2_000_000
-
-# последовательная версия
-seq_val, seq_time = measure(sequential_chain, N)
-print(f"Последовательная версия: {seq_time:.2f} ms")
-
-# 2 потока
-par2_val, par2_time = measure(parallel_chain, N, 2)
-speed2 = seq_time / par2_time
-print(f"2 потока: {par2_time:.2f} ms | ускорение: {speed2:.3f}x")
-
-# 4 потока
-par4_val, par4_time = measure(parallel_chain, N, 4)
-speed4 = seq_time / par4_time
-print(f"4 потока: {par4_time:.2f} ms | ускорение: {speed4:.3f}x")
\ No newline at end of file
+    res, elapsed = timing.measure(func, *args)
+    return res, elapsed * 1000
+
+
+if __name__ == "__main__":
+    N = 2_000_000
+
+    # последовательная версия
+    seq_val, seq_time = measure(sequential_chain, N)
+    print(f"Последовательная версия: {seq_time:.2f} ms")
+
+    # 2 потока
+    par2_val, par2_time = measure(parallel_chain, N, 2)
+    speed2 = seq_time / par2_time
+    print(f"2 потока: {par2_time:.2f} ms | ускорение: {speed2:.3f}x")
+
+    # 4 потока
+    par4_val, par4_time = measure(parallel_chain, N, 4)
+    speed4 = seq_time / par4_time
+    print(f"4 потока: {par4_time:.2f} ms | ускорение: {speed4:.3f}x")
+
+    # корректная параллельная версия: композиция аффинных отображений + скан
+    for workers in (2, 4):
+        scan_val, scan_time = measure(parallel_chain_scan, N, workers)
+        print(f"Скан, {workers} процесса: {scan_time:.2f} ms | "
+              f"ускорение: {seq_time / scan_time:.3f}x | совпадает: {scan_val == seq_val}")
+
+    # прыжок сразу на n-й шаг
+    jump_val, jump_time = measure(jump_chain, N)
+    print(f"Прыжок O(log n): {jump_time:.4f} ms | совпадает: {jump_val == seq_val}")
+    print(f"n = 1e9: {jump_chain(10 ** 9)}")
\ No newline at end of file
@@ -1,6 +1,10 @@
 import multiprocessing as mp
-import time
 import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import timing
 
 def worker_shared(arr, start, end, out, idx):
     s = 0
@@ -33,10 +37,8 @@ def parallel_sum_mp_shared(arr, n_processes):
     return sum(out)
 
 def measure(func, *args):
-    t0 = time.perf_counter()
-    res = func(*args)
-    t = (time.perf_counter() - t0) * 1000
-    return res, t
+    res, t = timing.measure(func, *args)
+    return res, t * 1000
 
 if __name__ == "__main__":
     SIZE = 2_000_000
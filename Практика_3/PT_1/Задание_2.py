@@ -1,6 +1,10 @@
 import multiprocessing as mp
+import sys
+from pathlib import Path
 import numpy as np
-import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import timing
 
 def compute_chunk(a, b, c, start, end, out, idx):
     out[idx] = np.sum(a[start:end] * b[start:end] + c[start:end])
@@ -37,18 +41,16 @@ if __name__ == "__main__":
     # ---------------------------
     # Последовательное выполнение
     # ---------------------------
-    t0 = time.perf_counter()
-    seq_result = np.sum(a * b + c)
-    seq_time = (time.perf_counter() - t0) * 1000
+    seq_result, seq_time = timing.measure(lambda: np.sum(a * b + c))
+    seq_time *= 1000
 
     print(f"Последовательное время: {seq_time:.2f} ms")
 
     # ---------------------------
     # Параллельное выполнение
     # ---------------------------
-    t0 = time.perf_counter()
-    par_result = parallel_compute(a, b, c, n_processes=4)
-    par_time = (time.perf_counter() - t0) * 1000
+    par_result, par_time = timing.measure(parallel_compute, a, b, c, n_processes=4)
+    par_time *= 1000
 
     print(f"Параллельное время: {par_time:.2f} ms")
     print(f"Ускорение: {seq_time / par_time:.2f}x")
@@ -1,21 +1,23 @@
 import threading
-import time
+import sys
+from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import timing
+
 def partial_sum(a, start, end, result, idx):
     s = 0
     for i in range(start, end):
         s += a[i]
     result[idx] = s
 
-def measure_time(n_threads, chunk_size, data):
+def threaded_sum(n_threads, chunk_size, data):
     n = len(data)
     results = [0] * n_threads
     threads = []
 
-    start_time = time.perf_counter()
-
     for t in range(n_threads):
         start = t * chunk_size
         end = (t + 1) * chunk_size if t < n_threads - 1 else n
@@ -31,8 +33,12 @@ def measure_time(n_threads, chunk_size, data):
     for th in threads:
         th.join()
 
-    total = sum(results)
-    return time.perf_counter() - start_time
+    return sum(results)
+
+
+def measure_time(n_threads, chunk_size, data):
+    # медиана устойчивого замера (timing.benchmark), а не один прогон
+    return timing.measure(threaded_sum, n_threads, chunk_size, data)[1]
 
 
 data = np.ones(1_000_000, dtype=np.int32)
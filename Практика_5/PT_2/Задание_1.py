@@ -1,6 +1,12 @@
-import time
 import concurrent.futures
 import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import timing
 
 def task1_original(n, a):
     for i in range(1, n):
@@ -47,13 +53,205 @@ def task1_parallel(n, a, num_workers=None):
     return new
 
 
+# Те же красно-чёрные проходы на int64-массивах: чётные и нечётные индексы —
+# срезы с шагом 2, без списков индексов. Память — два массива по 8n байт
+
+RB_CHUNK = 1 << 16  # элементов на кусок: old и new куска помещаются в L2
+
+
+def _task1_range(old, new, start, end, chunk=RB_CHUNK):
+    # new[i] = old[i-1] * 2 + i * 3 для i из [start, end), start >= 1.
+    # Читаем только old, поэтому чётные и нечётные можно проходить внутри
+    # одного куска: кусок остаётся в кэше между двумя проходами
+    for lo in range(start, end, chunk):
+        hi = min(lo + chunk, end)
+        for parity in (0, 1):  # сначала чётные, потом нечётные
+            s = lo + (parity - lo) % 2
+            dst = new[s:hi:2]
+            np.multiply(old[s - 1:hi - 1:2], 2, out=dst)
+            dst += np.arange(3 * s, 3 * hi, 6, dtype=np.int64)
+
+
+def task1_red_black_numpy(n, a):
+    old = np.asarray(a, dtype=np.int64)
+    new = old.copy()
+    _task1_range(old, new, 1, n)
+    return new
+
+
+def task1_slice_worker(args):
+    # воркер получает только имена shared memory и границы [start, end)
+    old_name, new_name, n, start, end = args
+    old_shm = shared_memory.SharedMemory(name=old_name)
+    new_shm = shared_memory.SharedMemory(name=new_name)
+    try:
+        old = np.ndarray((n,), dtype=np.int64, buffer=old_shm.buf)
+        new = np.ndarray((n,), dtype=np.int64, buffer=new_shm.buf)
+        _task1_range(old, new, start, end)
+        del old, new
+    finally:
+        old_shm.close()
+        new_shm.close()
+    return start, end
+
+
+def task1_parallel_numpy(n, a, num_workers=None, executor=None):
+    workers = num_workers or multiprocessing.cpu_count()
+    nbytes = max(1, n * 8)
+    old_shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    new_shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    try:
+        old = np.ndarray((n,), dtype=np.int64, buffer=old_shm.buf)
+        new = np.ndarray((n,), dtype=np.int64, buffer=new_shm.buf)
+        old[:] = a
+        new[:] = old
+
+        chunk = max(1, -(-(n - 1) // workers))
+        tasks = [(old_shm.name, new_shm.name, n, s, min(s + chunk, n))
+                 for s in range(1, n, chunk)]
+
+        if executor is None:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
+                list(ex.map(task1_slice_worker, tasks))
+        else:
+            list(executor.map(task1_slice_worker, tasks))
+
+        result = new.copy()
+        del old, new
+    finally:
+        old_shm.close()
+        old_shm.unlink()
+        new_shm.close()
+        new_shm.unlink()
+    return result
+
+
+# Линейная рекуррентность первого порядка a[i] = c[i] * a[i-1] + d[i].
+# Шаг — аффинное отображение (c, d); несколько шагов подряд сворачиваются
+# в одно (P, Q): a[i] = P[i] * a[s-1] + Q[i], где s — начало блока.
+
+INT64_LIMIT = 2.0 ** 62
+
+
+def _block_scan(c, d):
+    # Сканирование Хиллиса-Стила внутри блока: log2(L) векторных проходов,
+    # после которых P[i], Q[i] — композиция шагов блока с 0 по i
+    P = c.copy()
+    Q = d.copy()
+    off = 1
+    while off < len(P):
+        Q[off:] = P[off:] * Q[:-off] + Q[off:]
+        P[off:] = P[off:] * P[:-off]
+        off *= 2
+    return P, Q
+
+
+def _fits_int64(c, d, a0, block_size):
+    # Оценка сверху тем же сканом по модулям во float64: если все
+    # промежуточные P, Q и a меньше 2^62, вычисления в int64 точны
+    c_abs = np.abs(c.astype(np.float64))
+    d_abs = np.abs(d.astype(np.float64))
+    carry = abs(float(a0))
+    with np.errstate(over="ignore", invalid="ignore"):
+        for s in range(0, len(c), block_size):
+            P, Q = _block_scan(c_abs[s:s + block_size], d_abs[s:s + block_size])
+            a = P * carry + Q
+            if not (np.all(P < INT64_LIMIT) and np.all(Q < INT64_LIMIT)
+                    and np.all(a < INT64_LIMIT)):
+                return False
+            carry = a[-1]
+    return True
+
+
+def recurrence_block_worker(args):
+    # carry is None — вернуть свёртку блока (P, Q),
+    # иначе — значения a на блоке при a[s-1] = carry
+    c, d, carry = args
+
+    if c.dtype == object:
+        # длинная арифметика: векторный скан сделал бы O(L log L) умножений
+        # больших чисел, поэтому внутри блока идём последовательно
+        if carry is None:
+            p, q = 1, 0
+            for ci, di in zip(c, d):
+                p, q = ci * p, ci * q + di
+            return p, q
+        out = np.empty(len(c), dtype=object)
+        a = carry
+        for i, (ci, di) in enumerate(zip(c, d)):
+            a = ci * a + di
+            out[i] = a
+        return out
+
+    P, Q = _block_scan(c, d)
+    if carry is None:
+        return P[-1], Q[-1]
+    return P * carry + Q
+
+
+def linear_recurrence_scan(c, d, a0, block_size=1 << 16, num_workers=None):
+    # a[0] = a0, a[i] = c[i] * a[i-1] + d[i] для i >= 1 (c[0], d[0] не используются).
+    # Блочный скан: 1) свёртка каждого блока (параллельно), 2) перенос
+    # значений между блоками (последовательно, по одному числу на блок),
+    # 3) развёртка блоков с известным входом (параллельно).
+    # Целые считаются в int64, если оценка показывает, что переполнения
+    # не будет, иначе — в длинной арифметике Python (dtype=object, без скана)
+    c = np.asarray(c)[1:]
+    d = np.asarray(d)[1:]
+    n = len(c) + 1
+
+    if np.issubdtype(c.dtype, np.integer) and np.issubdtype(d.dtype, np.integer) \
+            and isinstance(a0, (int, np.integer)):
+        dtype = np.int64 if _fits_int64(c, d, a0, block_size) else object
+    else:
+        dtype = np.result_type(c, d, np.float64)
+
+    c = c.astype(dtype)
+    d = d.astype(dtype)
+    a0 = int(a0) if dtype in (np.int64, object) else a0
+
+    out = np.empty(n, dtype=dtype)
+    out[0] = a0
+    if dtype == object:
+        # Скан окупается только на машинных числах: в длинной арифметике
+        # свёртка и развёртка вдвое увеличивают работу с большими числами,
+        # а блоки больших чисел ещё и пересылаются между процессами.
+        # Поэтому здесь один последовательный проход без пула
+        out[1:] = recurrence_block_worker((c, d, a0))
+        return out
+
+    blocks = [(s, min(s + block_size, n - 1)) for s in range(0, n - 1, block_size)]
+
+    def run(tasks):
+        if num_workers == 1 or len(tasks) <= 1:
+            return [recurrence_block_worker(t) for t in tasks]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as ex:
+            return list(ex.map(recurrence_block_worker, tasks))
+
+    summaries = run([(c[s:e], d[s:e], None) for s, e in blocks])
+
+    carries = [a0]
+    for p, q in summaries[:-1]:
+        carries.append(p * carries[-1] + q)
+
+    for (s, e), block in zip(blocks, run([(c[s:e], d[s:e], carry)
+                                          for (s, e), carry in zip(blocks, carries)])):
+        out[s + 1:e + 1] = block
+    return out
+
+
+def task1_scan(n, a, num_workers=None, block_size=1 << 16):
+    # task1_original через общий решатель: c[i] = 2, d[i] = 3 * i
+    c = np.full(n, 2, dtype=np.int64)
+    d = np.arange(n, dtype=np.int64) * 3
+    return linear_recurrence_scan(c, d, a[0], block_size, num_workers).tolist()
+
+
 def measure(func, *args, **kwargs):
-    t0 = time.perf_counter()
-    res = func(*args, **kwargs)
-    return res, time.perf_counter() - t0
+    return timing.measure(func, *args, **kwargs)
 
 
-def run_experiment():
+def run_experiment(numpy_sizes=(10_000_000, 100_000_000)):
     sizes = [10_000, 100_000]  # 1000000 для ProcessPool упирается в оперативку 
     workers = multiprocessing.cpu_count()
 
@@ -74,11 +272,36 @@ def run_experiment():
         # 3) transformed (параллельно)
         res_par, t_par = measure(task1_parallel, n, a_init.copy(), workers)
 
+        # 4) красно-чёрные проходы на массивах
+        res_np, t_np = measure(task1_red_black_numpy, n, a_init)
+        res_np_par, t_np_par = measure(task1_parallel_numpy, n, a_init, workers)
+
+        # 5) блочный скан линейной рекуррентности
+        res_scan, t_scan = measure(task1_scan, n, a_init.copy(), workers, n // workers + 1)
+
         print(f"Оригинал (seq):            {t_orig:.4f} сек")
         print(f"Преобразованный (seq):     {t_tr:.4f} сек")
         print(f"Преобразованный (parallel):{t_par:.4f} сек")
         print(f"Совпадение parallel==transformed: {res_par == res_tr}")
         print(f"Совпадение transformed==original: {res_tr == res_orig}")
+        print(f"NumPy (seq):               {t_np:.4f} сек")
+        print(f"NumPy (parallel):          {t_np_par:.4f} сек")
+        print(f"Совпадение numpy==transformed: {res_np.tolist() == res_tr}, "
+              f"{res_np_par.tolist() == res_tr}")
+        print(f"Скан (parallel):           {t_scan:.4f} сек")
+        print(f"Совпадение scan==original: {res_scan == res_orig}")
+
+    # на массивах помещаются размеры, недоступные спискам
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
+        for n in numpy_sizes:
+            a_init = np.ones(n, dtype=np.int64)
+            res_np, t_np = measure(task1_red_black_numpy, n, a_init)
+            del res_np
+            res_par, t_par = measure(task1_parallel_numpy, n, a_init, workers, ex)
+            del res_par
+            # чтение old и запись new: 16 байт на элемент
+            print(f"\nn = {n}: NumPy (seq) {t_np:.4f} сек ({16 * n / t_np / 1e9:.2f} ГБ/с), "
+                  f"NumPy (parallel) {t_par:.4f} сек ({16 * n / t_par / 1e9:.2f} ГБ/с)")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,13 @@
-import time
+import math
 import concurrent.futures
 import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import timing
 
 def task2_original(n, x, y, z):
     for i in range(1, n):
@@ -58,10 +65,202 @@ def task2_parallel(n, x, y, z, num_workers=None):
 
     return new_x, new_y, new_z
 
+
+# Красно-чёрные проходы на int64-массивах. Состояние — массив (3, n)
+# со строками x, y, z; чётные и нечётные индексы — срезы с шагом 2
+
+RB_CHUNK = 1 << 15  # элементов на кусок: шесть строк куска помещаются в L2
+
+
+def _task2_range(old, new, start, end, chunk=RB_CHUNK):
+    # шаг task2 для i из [start, end), start >= 1, только по old
+    for lo in range(start, end, chunk):
+        hi = min(lo + chunk, end)
+        for parity in (0, 1):  # сначала чётные, потом нечётные
+            s = lo + (parity - lo) % 2
+            ox, oy, oz = old[:, s - 1:hi - 1:2]
+            nx, ny, nz = new[:, s:hi:2]
+            np.add(oy, oz, out=nx)
+            np.multiply(ox, 2, out=ny)
+            ny += oz
+            np.add(nx, ny, out=nz)
+            nz += np.arange(s, hi, 2, dtype=np.int64)
+
+
+def task2_red_black_numpy(n, x, y, z):
+    old = np.empty((3, n), dtype=np.int64)
+    old[0], old[1], old[2] = x, y, z
+    new = old.copy()
+    _task2_range(old, new, 1, n)
+    return new[0], new[1], new[2]
+
+
+def task2_slice_worker(args):
+    # воркер получает только имена shared memory и границы [start, end)
+    old_name, new_name, n, start, end = args
+    old_shm = shared_memory.SharedMemory(name=old_name)
+    new_shm = shared_memory.SharedMemory(name=new_name)
+    try:
+        old = np.ndarray((3, n), dtype=np.int64, buffer=old_shm.buf)
+        new = np.ndarray((3, n), dtype=np.int64, buffer=new_shm.buf)
+        _task2_range(old, new, start, end)
+        del old, new
+    finally:
+        old_shm.close()
+        new_shm.close()
+    return start, end
+
+
+def task2_parallel_numpy(n, x, y, z, num_workers=None, executor=None):
+    workers = num_workers or multiprocessing.cpu_count()
+    nbytes = max(1, 3 * n * 8)
+    old_shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    new_shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    try:
+        old = np.ndarray((3, n), dtype=np.int64, buffer=old_shm.buf)
+        new = np.ndarray((3, n), dtype=np.int64, buffer=new_shm.buf)
+        old[0], old[1], old[2] = x, y, z
+        new[:] = old
+
+        chunk = max(1, -(-(n - 1) // workers))
+        tasks = [(old_shm.name, new_shm.name, n, s, min(s + chunk, n))
+                 for s in range(1, n, chunk)]
+
+        if executor is None:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
+                list(ex.map(task2_slice_worker, tasks))
+        else:
+            list(executor.map(task2_slice_worker, tasks))
+
+        result = new.copy()
+        del old, new
+    finally:
+        old_shm.close()
+        old_shm.unlink()
+        new_shm.close()
+        new_shm.unlink()
+    return result[0], result[1], result[2]
+
+
+# Один шаг task2 — аффинное отображение состояния v = (x, y, z):
+#   x[i] = y[i-1] + z[i-1]
+#   y[i] = 2*x[i-1] + z[i-1]
+#   z[i] = x[i] + y[i] + i = 2*x[i-1] + y[i-1] + 2*z[i-1] + i
+# то есть v[i] = A @ v[i-1] + b[i], b[i] = (0, 0, i)
+TASK2_MATRIX = np.array([[0, 1, 1],
+                         [2, 0, 1],
+                         [2, 1, 2]], dtype=np.int64)
+
+
+def _matrix_block_scan(M, t):
+    # Скан Хиллиса-Стила по блоку: после него (M[i], t[i]) — композиция
+    # шагов блока с 0 по i, v[i] = M[i] @ v_in + t[i]
+    M = M.copy()
+    t = t.copy()
+    off = 1
+    while off < len(M):
+        t[off:] = np.einsum("nij,nj->ni", M[off:], t[:-off]) + t[off:]
+        M[off:] = np.matmul(M[off:], M[:-off])
+        off *= 2
+    return M, t
+
+
+def matrix_block_worker(args):
+    # carry is None — вернуть свёртку блока (M, t), иначе — состояния блока
+    A, b, carry = args
+
+    if b.dtype == object:
+        # длинная арифметика: последовательно, без векторного скана.
+        # Матрица постоянна, поэтому M = A^L считается быстрым возведением
+        # в степень, а t — прогоном блока с нулевым входом
+        A = A.astype(object)
+        if carry is None:
+            M = np.identity(len(A), dtype=np.int64).astype(object)
+            P, L = A, len(b)
+            while L > 0:
+                if L & 1:
+                    M = P.dot(M)
+                P = P.dot(P)
+                L >>= 1
+            # от блока нужен только последний вектор, промежуточные не хранятся
+            v = np.zeros(len(A), dtype=object)
+            for bi in b:
+                v = A.dot(v) + bi
+            return M, v
+
+        out = np.empty(b.shape, dtype=object)
+        v = carry
+        for i, bi in enumerate(b):
+            v = A.dot(v) + bi
+            out[i] = v
+        return out
+
+    M, t = _matrix_block_scan(np.broadcast_to(A, (len(b),) + A.shape), b)
+    if carry is None:
+        return M[-1], t[-1]
+    return np.einsum("nij,j->ni", M, carry) + t
+
+
+def _matrix_fits_int64(A, b, v0, n):
+    # грубая оценка: |v[i]|_inf <= r^i * (|v0| + sum|b|), r — макс. сумма строки |A|
+    r = max(1, int(np.abs(A).sum(axis=1).max()))
+    base = max(abs(int(x)) for x in v0) + int(np.abs(b).sum()) + 1
+    return n * math.log2(r) + math.log2(base) + 2 * math.log2(r + 1) < 62
+
+
+def matrix_recurrence_scan(A, b, v0, block_size=1 << 14, num_workers=None):
+    # v[0] = v0, v[i] = A @ v[i-1] + b[i] для i >= 1 (b[0] не используется).
+    # Блочный скан: свёртка блоков в (M, t) параллельно, перенос состояния
+    # между блоками последовательно, развёртка блоков параллельно.
+    # Возвращает массив (n, k): int64, если переполнение исключено, иначе
+    # object (тогда без скана, см. ниже)
+    A = np.asarray(A, dtype=np.int64)
+    b = np.asarray(b)[1:]
+    n = len(b) + 1
+
+    dtype = np.int64 if _matrix_fits_int64(A, b, v0, n) else object
+    b = b.astype(dtype)
+    v0 = np.array([int(x) for x in v0], dtype=dtype)
+
+    out = np.empty((n, len(v0)), dtype=dtype)
+    out[0] = v0
+    if dtype == object:
+        # Скан окупается только в int64: в длинной арифметике свёртка и
+        # развёртка вдвое увеличивают работу с большими числами, а блоки
+        # больших чисел ещё и пересылаются между процессами. Поэтому
+        # здесь один последовательный проход без пула
+        out[1:] = matrix_block_worker((A, b, v0))
+        return out
+
+    blocks = [(s, min(s + block_size, n - 1)) for s in range(0, n - 1, block_size)]
+
+    def run(tasks):
+        if num_workers == 1 or len(tasks) <= 1:
+            return [matrix_block_worker(t) for t in tasks]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as ex:
+            return list(ex.map(matrix_block_worker, tasks))
+
+    summaries = run([(A, b[s:e], None) for s, e in blocks])
+
+    carries = [v0]
+    for M, t in summaries[:-1]:
+        carries.append(M.dot(carries[-1]) + t)
+
+    for (s, e), block in zip(blocks, run([(A, b[s:e], carry)
+                                          for (s, e), carry in zip(blocks, carries)])):
+        out[s + 1:e + 1] = block
+    return out
+
+
+def task2_scan(n, x, y, z, num_workers=None, block_size=1 << 14):
+    b = np.zeros((n, 3), dtype=np.int64)
+    b[:, 2] = np.arange(n)
+    v = matrix_recurrence_scan(TASK2_MATRIX, b, (x[0], y[0], z[0]), block_size, num_workers)
+    return v[:, 0].tolist(), v[:, 1].tolist(), v[:, 2].tolist()
+
+
 def measure(func, *args, **kwargs):
-    t0 = time.perf_counter()
-    res = func(*args, **kwargs)
-    return res, time.perf_counter() - t0
+    return timing.measure(func, *args, **kwargs)
 
 
 def arrays_equal(triple1, triple2):
@@ -69,7 +268,8 @@ def arrays_equal(triple1, triple2):
     x2, y2, z2 = triple2
     return (x1 == x2) and (y1 == y2) and (z1 == z2)
 
-def run_experiment():
+def run_experiment(numpy_sizes=(10_000_000, 30_000_000)):
+    # numpy_sizes: old и new — по три строки int64, 48 байт на элемент
     workers = multiprocessing.cpu_count()
     sizes = [10_000, 100_000]
 
@@ -93,18 +293,45 @@ def run_experiment():
         # 3) transformed (параллельный)
         par_res, t_par = measure(task2_parallel, n, x0.copy(), y0.copy(), z0.copy(), workers)
 
+        # 4) красно-чёрные проходы на массивах
+        np_res, t_np = measure(task2_red_black_numpy, n, x0, y0, z0)
+        np_par_res, t_np_par = measure(task2_parallel_numpy, n, x0, y0, z0, workers)
+
+        # 5) матричный скан (совпадает с оригиналом)
+        scan_res, t_scan = measure(task2_scan, n, x0.copy(), y0.copy(), z0.copy(), workers,
+                                   n // workers + 1)
+
         print(f"Original (seq):             {t_orig:.4f} сек")
         print(f"Transformed (seq):          {t_tr:.4f} сек")
         print(f"Transformed (parallel):     {t_par:.4f} сек")
 
         print(f"parallel == transformed:    {arrays_equal(par_res, tr_res)}")
         print(f"transformed == original:    {arrays_equal(tr_res, orig_res)}")
+        print(f"NumPy (seq):                {t_np:.4f} сек")
+        print(f"NumPy (parallel):           {t_np_par:.4f} сек")
+        print(f"numpy == transformed:       "
+              f"{arrays_equal([v.tolist() for v in np_res], tr_res)}, "
+              f"{arrays_equal([v.tolist() for v in np_par_res], tr_res)}")
+        print(f"Matrix scan (parallel):     {t_scan:.4f} сек")
+        print(f"scan == original:           {arrays_equal(scan_res, orig_res)}")
 
         if t_par > 0:
             print(f"Ускорение (orig/par):       {t_orig / t_par:.2f}x")
         else:
             print("Ускорение (orig/par):       n/a")
 
+    # на массивах помещаются размеры, недоступные спискам
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as ex:
+        for n in numpy_sizes:
+            x0 = y0 = z0 = np.ones(n, dtype=np.int64)
+            res_np, t_np = measure(task2_red_black_numpy, n, x0, y0, z0)
+            del res_np
+            res_par, t_par = measure(task2_parallel_numpy, n, x0, y0, z0, workers, ex)
+            del res_par
+            # чтение трёх строк old и запись трёх строк new: 48 байт на элемент
+            print(f"\nn = {n}: NumPy (seq) {t_np:.4f} сек ({48 * n / t_np / 1e9:.2f} ГБ/с), "
+                  f"NumPy (parallel) {t_par:.4f} сек ({48 * n / t_par / 1e9:.2f} ГБ/с)")
+
 
 if __name__ == "__main__":
     run_experiment()
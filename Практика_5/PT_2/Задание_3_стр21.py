@@ -1,8 +1,338 @@
 import ast
 import concurrent.futures
+import math
 import multiprocessing
+import sys
+import textwrap
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
 from typing import Dict, List
 
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from loop_vectorizer import VectorizedLoop, vectorize_loop
+import timing
+
+
+# Накладные расходы на один блок по бэкендам (секунды): постановка задачи
+# в пул, для процессов — ещё пересылка аргументов и подключение к shared memory
+BLOCK_OVERHEAD = {"thread": 2e-5, "process": 5e-4, "numpy": 2e-5}
+OVERHEAD_SHARE = 0.05   # накладные расходы — не больше 5% работы блока
+BLOCKS_PER_WORKER = 4   # запас блоков на воркер для балансировки
+COST_SAMPLE = 256       # итераций в пробном блоке для оценки стоимости
+
+
+def double_buffer_step(old, new, start, end):
+    # тело цикла после сдваивания буферов, итерации [start, end)
+    for i in range(start, end):
+        new[i] = old[i - 1] * 2 + i * 3
+
+
+def double_buffer_step_numpy(old, new, start, end):
+    new[start:end] = old[start - 1:end - 1] * 2 + np.arange(start, end) * 3
+
+
+def _block_shm_worker(args):
+    old_name, new_name, shape, dtype, kernel, start, end = args
+    old_shm = shared_memory.SharedMemory(name=old_name)
+    new_shm = shared_memory.SharedMemory(name=new_name)
+    try:
+        old = np.ndarray(shape, dtype=dtype, buffer=old_shm.buf)
+        new = np.ndarray(shape, dtype=dtype, buffer=new_shm.buf)
+        kernel(old, new, start, end)
+        del old, new
+    finally:
+        old_shm.close()
+        new_shm.close()
+    return start, end
+
+
+class BlockExecutor:
+    # Выполняет цикл без зависимостей между итерациями (после сдваивания
+    # буферов ядро читает только old и пишет только new) блоками итераций.
+    # Ядро — функция kernel(old, new, start, end). Бэкенды:
+    #   "thread"  — скалярное ядро в потоках;
+    #   "process" — скалярное ядро в процессах, old и new в shared memory
+    #               (ядро должно быть функцией уровня модуля);
+    #   "numpy"   — векторное ядро в потоках, NumPy отпускает GIL
+    def __init__(self, backend: str = "numpy", num_workers: int = None):
+        if backend not in BLOCK_OVERHEAD:
+            raise ValueError(f"Неизвестный бэкенд: {backend!r}, ожидается один из {sorted(BLOCK_OVERHEAD)}")
+        self.backend = backend
+        self.num_workers = num_workers or multiprocessing.cpu_count()
+
+    def estimate_iteration_cost(self, kernel, old, new, start, end):
+        # Пробный блок считается по-настоящему: возвращаем стоимость одной
+        # итерации и индекс, с которого продолжать
+        stop = min(end, start + COST_SAMPLE)
+        t0 = time.perf_counter()
+        kernel(old, new, start, stop)
+        elapsed = time.perf_counter() - t0
+        return elapsed / max(1, stop - start), stop
+
+    def chunk_size(self, iter_cost: float, iterations: int) -> int:
+        # блок не меньше, чем нужно, чтобы окупить накладные расходы,
+        # и не больше, чем нужно для BLOCKS_PER_WORKER блоков на воркер
+        overhead = BLOCK_OVERHEAD[self.backend]
+        by_overhead = math.ceil(overhead / (OVERHEAD_SHARE * max(iter_cost, 1e-9)))
+        by_balance = math.ceil(iterations / (BLOCKS_PER_WORKER * self.num_workers))
+        return max(1, by_overhead, by_balance)
+
+    def run(self, kernel, old, new, start: int, end: int) -> List[tuple]:
+        iter_cost, start = self.estimate_iteration_cost(kernel, old, new, start, end)
+        if start >= end:
+            return []
+
+        chunk = self.chunk_size(iter_cost, end - start)
+        blocks = [(s, min(s + chunk, end)) for s in range(start, end, chunk)]
+
+        if len(blocks) == 1 or self.num_workers == 1:
+            for s, e in blocks:
+                kernel(old, new, s, e)
+        elif self.backend == "process":
+            self._run_processes(kernel, old, new, blocks)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                list(executor.map(lambda b: kernel(old, new, *b), blocks))
+
+        return blocks
+
+    def _run_processes(self, kernel, old, new, blocks):
+        old_shm = shared_memory.SharedMemory(create=True, size=max(1, old.nbytes))
+        new_shm = shared_memory.SharedMemory(create=True, size=max(1, new.nbytes))
+        try:
+            old_sh = np.ndarray(old.shape, dtype=old.dtype, buffer=old_shm.buf)
+            new_sh = np.ndarray(new.shape, dtype=new.dtype, buffer=new_shm.buf)
+            old_sh[:] = old
+            new_sh[:] = new
+
+            tasks = [(old_shm.name, new_shm.name, old.shape, old.dtype, kernel, s, e)
+                     for s, e in blocks]
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+                list(executor.map(_block_shm_worker, tasks))
+
+            new[:] = new_sh
+            del old_sh, new_sh
+        finally:
+            old_shm.close()
+            old_shm.unlink()
+            new_shm.close()
+            new_shm.unlink()
+
+
+# Компиляция тела цикла в ядро kernel(old, new, start, end) со сдваиванием
+# буферов. Массивы цикла хранятся строками одного массива (k, n): чтения
+# идут из old, записи — в new. Исключение — чтение a[i] после записи a[i]
+# в той же итерации: оно берётся из new, как локальная переменная
+# в task2_transformed_red_black
+
+class LoopKernel:
+    # Ядро из исходного текста. При распаковке собирается заново,
+    # поэтому годится и для бэкенда "process"
+    def __init__(self, source: str, env: Dict = None):
+        self.source = source
+        self.env = dict(env or {})
+        namespace = {"np": np, **self.env}
+        exec(compile(source, "<loop kernel>", "exec"), namespace)
+        self.func = namespace["kernel"]
+
+    def __call__(self, old, new, start, end):
+        self.func(old, new, start, end)
+
+    def __reduce__(self):
+        return LoopKernel, (self.source, self.env)
+
+
+class _ProbeBuffer:
+    # new для пробной итерации: запоминает записанные значения,
+    # непрочитанные элементы берёт из base
+    def __init__(self, base):
+        self.base = base
+        self.values = {}
+
+    def __setitem__(self, key, value):
+        self.values[key] = value
+
+    def __getitem__(self, key):
+        return self.values[key] if key in self.values else self.base[key]
+
+
+def result_dtype(kernel, old, start, stop):
+    # Тип new по одной пробной итерации скалярного ядра: тело может давать
+    # значения другого типа, чем вход (например, деление целых), и new
+    # с типом old молча обрежет их. Нечисловые значения — dtype=object
+    if start >= stop:
+        return old.dtype
+    probe = _ProbeBuffer(old)
+    kernel(old, probe, start, start + 1)
+    dtypes = [old.dtype]
+    for value in probe.values.values():
+        dtype = np.asarray(value).dtype
+        if dtype.kind not in "biufc":
+            return np.dtype(object)
+        dtypes.append(dtype)
+    return np.result_type(*dtypes)
+
+
+class CallableKernel:
+    # Ядро из функции func(old, i) -> новое значение new[i]. При
+    # vectorized=True func вызывается один раз с массивом индексов
+    def __init__(self, func, vectorized: bool = False):
+        self.func = func
+        self.vectorized = vectorized
+
+    def __call__(self, old, new, start, end):
+        if self.vectorized:
+            new[start:end] = self.func(old, np.arange(start, end))
+        else:
+            for i in range(start, end):
+                new[i] = self.func(old, i)
+
+
+def _is_affine_index(node, var: str) -> bool:
+    # i, i + k, i - k, k + i
+    if isinstance(node, ast.Name):
+        return node.id == var
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub)):
+        def is_const(x):
+            return isinstance(x, ast.Constant) and isinstance(x.value, int)
+        if _is_affine_index(node.left, var) and is_const(node.right):
+            return True
+        if isinstance(node.op, ast.Add) and is_const(node.left):
+            return _is_affine_index(node.right, var)
+    return False
+
+
+def _is_vectorizable(body, var: str, arrays) -> bool:
+    # только присваивания элементов массивов с индексами i + k
+    # и арифметика над ними — тогда i можно заменить на arange
+    allowed = (ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Subscript,
+               ast.operator, ast.unaryop, ast.Load)
+    for stmt in body:
+        if not (isinstance(stmt, ast.Assign) and len(stmt.targets) == 1):
+            return False
+        target = stmt.targets[0]
+        if not (isinstance(target, ast.Subscript) and isinstance(target.value, ast.Name)
+                and target.value.id in arrays and _is_affine_index(target.slice, var)):
+            return False
+
+        subscripted = set()
+        for node in ast.walk(stmt.value):
+            if not isinstance(node, allowed):
+                return False
+            if isinstance(node, ast.Subscript):
+                if not (isinstance(node.value, ast.Name) and node.value.id in arrays
+                        and _is_affine_index(node.slice, var)):
+                    return False
+                subscripted.add(id(node.value))
+        for node in ast.walk(stmt.value):
+            if isinstance(node, ast.Name) and node.id in arrays and id(node) not in subscripted:
+                return False
+    return True
+
+
+class _DoubleBufferTransformer(ast.NodeTransformer):
+    def __init__(self, var: str, rows: Dict[str, int]):
+        self.var = var
+        self.rows = rows
+        self.written = set()
+
+    def _buffer(self, buffer: str, node):
+        index = ast.Tuple(elts=[ast.Constant(self.rows[node.value.id]), node.slice], ctx=ast.Load())
+        return ast.Subscript(value=ast.Name(id=buffer, ctx=ast.Load()), slice=index, ctx=node.ctx)
+
+    def _is_array(self, node) -> bool:
+        return (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name)
+                and node.value.id in self.rows)
+
+    def _write(self, target):
+        if not self._is_array(target):
+            return self.visit(target)
+        target.slice = self.visit(target.slice)
+        self.written.add(target.value.id)
+        return self._buffer("new", target)
+
+    def visit_Assign(self, node):
+        node.value = self.visit(node.value)
+        node.targets = [self._write(t) for t in node.targets]
+        return node
+
+    def visit_AugAssign(self, node):
+        node.value = self.visit(node.value)
+        node.target = self._write(node.target)
+        return node
+
+    def visit_Subscript(self, node):
+        node = self.generic_visit(node)
+        if not self._is_array(node):
+            return node
+        same_iteration = isinstance(node.slice, ast.Name) and node.slice.id == self.var
+        if same_iteration and node.value.id in self.written:
+            return self._buffer("new", node)
+        return self._buffer("old", node)
+
+
+def compile_double_buffered(source: str, env: Dict = None) -> Dict:
+    # Цикл вида for i in range([k,] n): ... -> скалярное ядро и, если тело
+    # состоит из аффинных присваиваний, векторное (i заменяется на arange).
+    # start и stop — границы range, вычисленные в env (например, {"n": n})
+    tree = ast.parse(textwrap.dedent(source))
+    loops = [node for node in tree.body if isinstance(node, ast.For)]
+    if len(loops) != 1:
+        raise ValueError("Ожидается один цикл вида: for i in range(k, n):")
+    loop = loops[0]
+
+    header = loop.iter
+    if not (isinstance(loop.target, ast.Name) and isinstance(header, ast.Call)
+            and isinstance(header.func, ast.Name) and header.func.id == "range"
+            and 1 <= len(header.args) <= 2):
+        raise ValueError("Ожидается цикл вида: for i in range(k, n):")
+    var = loop.target.id
+
+    env = dict(env or {})
+    bounds = [eval(compile(ast.Expression(arg), "<range>", "eval"), {}, dict(env))
+              for arg in header.args]
+    start, stop = ([0] + bounds)[-2:]
+
+    arrays = sorted({node.value.id for node in ast.walk(loop)
+                     if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name)})
+    rows = {name: r for r, name in enumerate(arrays)}
+
+    vectorizable = _is_vectorizable(loop.body, var, rows)
+    transformer = _DoubleBufferTransformer(var, rows)
+    body = [transformer.visit(stmt) for stmt in loop.body]
+    body_src = "\n".join(ast.unparse(ast.fix_missing_locations(stmt)) for stmt in body)
+
+    scalar_src = (f"def kernel(old, new, start, end):\n"
+                  f"    for {var} in range(start, end):\n"
+                  + textwrap.indent(body_src, " " * 8) + "\n")
+    vector_src = (f"def kernel(old, new, start, end):\n"
+                  f"    {var} = np.arange(start, end)\n"
+                  + textwrap.indent(body_src, " " * 4) + "\n")
+
+    return {
+        "var": var,
+        "arrays": arrays,
+        "written": sorted(transformer.written),
+        "start": start,
+        "stop": stop,
+        "scalar": LoopKernel(scalar_src, env),
+        "vectorized": LoopKernel(vector_src, env) if vectorizable else None,
+    }
+
+
+def _unpack_row(original, values, start, stop):
+    # Список: в копию входа возвращается только пройденный диапазон
+    # [start, stop), остальные элементы сохраняют свои объекты и типы.
+    # Массив NumPy возвращается целиком, с типом результата
+    if not isinstance(original, list):
+        return values
+    result = list(original)
+    result[start:stop] = values[start:stop].tolist()
+    return result
+
 
 class LoopAnalyzer:
     # Анализ зависимостей (упрощённый AST-анализ)
@@ -56,29 +386,115 @@ class LoopAnalyzer:
 
         return recommendations
 
-    def apply_double_buffering(self, func, n, arr):
-        old = arr.copy()
-        new = arr.copy()
+    def build_kernels(self, func, n, arr):
+        # func: None — встроенное тело new[i] = old[i-1] * 2 + i * 3;
+        # функция func(old, i) -> new[i]; строка — исходник цикла
+        # (arr — словарь {имя: массив} или один массив, если он в цикле один).
+        # Возвращает скалярное ядро, векторное (или None), old, границы
+        # итераций и функцию, собирающую результат в исходный формат
+        if not isinstance(func, str):
+            if func is None:
+                scalar, vectorized = double_buffer_step, double_buffer_step_numpy
+            else:
+                scalar, vectorized = CallableKernel(func), CallableKernel(func, vectorized=True)
 
-        for i in range(1, n):
-            new[i] = old[i - 1] * 2 + i * 3
+            def unpack(new):
+                return _unpack_row(arr, new, 1, n)
 
-        return new
+            return scalar, vectorized, np.array(arr), 1, n, unpack
 
-    def parallel_execute(self, func, n, arr):
-        old = arr.copy()
-        new = arr.copy()
+        compiled = compile_double_buffered(func, {"n": n})
+        names = compiled["arrays"]
+        start, stop = compiled["start"], compiled["stop"]
 
-        def worker(i):
-            return i, old[i - 1] * 2 + i * 3
+        def unpack_row(original, values, name):
+            # массивы, которые цикл только читает, возвращаются как были
+            if name not in compiled["written"]:
+                return list(original) if isinstance(original, list) else original
+            return _unpack_row(original, values, start, stop)
 
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=multiprocessing.cpu_count()
-        ) as executor:
-            for i, val in executor.map(worker, range(1, n)):
-                new[i] = val
+        if isinstance(arr, dict):
+            missing = [name for name in names if name not in arr]
+            if missing:
+                raise ValueError(f"Не переданы массивы цикла: {missing}")
+            old = np.array([arr[name] for name in names])
+
+            def unpack(new):
+                result = dict(arr)
+                for r, name in enumerate(names):
+                    result[name] = unpack_row(arr[name], new[r], name)
+                return result
+        else:
+            if len(names) != 1:
+                raise ValueError(f"В цикле несколько массивов {names}, передайте словарь")
+            old = np.array([arr])
 
-        return new
+            def unpack(new):
+                return unpack_row(arr, new[0], names[0])
+
+        return compiled["scalar"], compiled["vectorized"], old, start, stop, unpack
+
+    def vectorize(self, code: str, deps: Dict = None) -> VectorizedLoop:
+        # Цикл без зависимостей (D=0) -> NumPy-срезы; цикл с D=1 не
+        # векторизуется: сначала нужно одно из recommend_transformations
+        deps = deps or self.analyze_dependencies(code)
+        if deps["type"] == "D=1":
+            raise ValueError(
+                "Цикл с зависимостью D=1 не векторизуется, сначала: "
+                + ", ".join(self.recommend_transformations(deps))
+            )
+        return vectorize_loop(code)
+
+    def apply_double_buffering(self, func, n, arr):
+        # тот же путь, что и parallel_execute, только без распараллеливания
+        kernel, _, old, start, stop, unpack = self.build_kernels(func, n, arr)
+        new = old.astype(result_dtype(kernel, old, start, stop))
+        kernel(old, new, start, stop)
+        return unpack(new)
+
+    def _vectorized_matches(self, scalar, vectorized, old, new, start, stop):
+        # Пробный прогон на нескольких итерациях: векторное ядро должно
+        # отработать и совпасть со скалярным. Ядра пишут только функцию от
+        # old, поэтому основной прогон всё перезапишет
+        end = min(stop, start + 8)
+        scalar(old, new, start, end)
+        expected = new[..., start:end].copy()
+        try:
+            vectorized(old, new, start, end)
+        except Exception:
+            return False
+        return np.array_equal(new[..., start:end], expected)
+
+    def parallel_execute(self, func, n, arr, deps: Dict = None,
+                         backend: str = "numpy", num_workers: int = None,
+                         double_buffering: bool = False):
+        # Блочное выполнение через BlockExecutor. Цикл с D=1 выполняется
+        # только со сдваиванием буферов (double_buffering=True), иначе —
+        # отказ со списком рекомендуемых преобразований. Для исходника
+        # зависимости анализируются автоматически
+        if deps is None and isinstance(func, str):
+            deps = self.analyze_dependencies(func)
+        if deps is not None and deps["type"] == "D=1" and not double_buffering:
+            raise ValueError(
+                "Цикл с зависимостью D=1 нельзя выполнять параллельно, сначала: "
+                + ", ".join(self.recommend_transformations(deps))
+            )
+
+        kernel, vectorized, old, start, stop, unpack = self.build_kernels(func, n, arr)
+        new = old.astype(result_dtype(kernel, old, start, stop))
+        if new.dtype == object and backend == "process":
+            # объекты Python в shared memory не положить
+            backend = "thread"
+
+        if backend == "numpy":
+            if vectorized is not None and self._vectorized_matches(kernel, vectorized, old, new, start, stop):
+                kernel = vectorized
+            else:
+                # тело не векторизуется — скалярное ядро в потоках
+                backend = "thread"
+
+        BlockExecutor(backend, num_workers).run(kernel, old, new, start, stop)
+        return unpack(new)
 
 if __name__ == "__main__":
     analyzer = LoopAnalyzer()
@@ -106,9 +522,65 @@ for i in range(1, n):
         print("Зависимости:", deps)
         print("Рекомендации:", analyzer.recommend_transformations(deps))
 
-    n = 10_000
+    n = 200_000
     a = [1] * n
 
     print("\n=== Автоматическое преобразование + распараллеливание ===")
-    res = analyzer.parallel_execute(None, n, a)
-    print("Готово, результат вычислен")
+    try:
+        analyzer.parallel_execute(None, n, a, analyzer.analyze_dependencies(code1))
+    except ValueError as e:
+        print("Отказ:", e)
+
+    # после сдваивания буферов чтение и запись идут в разные массивы
+    code_db = """
+for i in range(1, n):
+    new[i] = old[i-1] * 2 + i * 3
+"""
+    deps = analyzer.analyze_dependencies(code_db)
+    print("Зависимости после сдваивания:", deps["type"])
+
+    expected, elapsed = timing.measure(analyzer.apply_double_buffering, None, n, a)
+    print(f"Последовательно:  {elapsed:.4f} сек")
+
+    for backend in ("thread", "process", "numpy"):
+        res, elapsed = timing.measure(analyzer.parallel_execute, None, n, a, deps, backend=backend)
+        print(f"{backend:<8}          {elapsed:.4f} сек, совпадает: {res == expected}")
+
+    print("\n=== Ядра из исходника цикла и из функции ===")
+    for idx, code in enumerate([code1, code2, code3], start=1):
+        compiled = compile_double_buffered(code, {"n": n})
+        arrays = {name: [1] * n for name in compiled["arrays"]}
+        expected = analyzer.apply_double_buffering(code, n, arrays)
+        for backend in ("thread", "process", "numpy"):
+            res, elapsed = timing.measure(analyzer.parallel_execute, code, n, arrays,
+                                          backend=backend, double_buffering=True)
+            print(f"ПРИМЕР {idx}, {backend:<8} {elapsed:.4f} сек, совпадает: {res == expected}")
+
+    print("\n=== Векторизация цикла без зависимостей ===")
+    loop = analyzer.vectorize(code2)
+    print("Векторизован:", loop.vectorized)
+    print(loop.generated)
+    b, c = list(range(n)), list(range(n, 0, -1))
+    expected = [0] * n
+    for i in range(n):
+        expected[i] = b[i] + c[i]
+    a2 = [0] * n
+    _, elapsed = timing.measure(loop, n=n, a=a2, b=b, c=c)
+    print(f"NumPy-срезы: {elapsed:.4f} сек, совпадает: {a2 == expected}")
+
+    # тело с делением: результат вещественный, хотя вход целый
+    half = "for i in range(1, n):\n    a[i] = b[i] / 2\n"
+    arrays = {"a": [0] * 6, "b": list(range(6))}
+    seq = analyzer.apply_double_buffering(half, 6, arrays)
+    par = analyzer.parallel_execute(half, 6, arrays, backend="numpy")
+    print(f"Деление: {seq['a']} == {par['a']}: {seq == par}")
+    seq = analyzer.apply_double_buffering(lambda old, i: old[i - 1] / 2, 6, [1] * 6)
+    par = analyzer.parallel_execute(lambda old, i: old[i - 1] / 2, 6, [1] * 6, backend="thread")
+    print(f"Деление (функция): {seq} == {par}: {seq == par}")
+
+    def step(old, i):
+        return old[i - 1] * 2 + i * 3
+
+    res = analyzer.parallel_execute(step, n, a, backend="numpy")
+    print(f"Функция step, numpy: совпадает со встроенным телом: "
+          f"{res == analyzer.apply_double_buffering(None, n, a)}")
@@ -1,7 +1,15 @@
 import numpy as np
-import time
+from numpy.lib.stride_tricks import sliding_window_view
+import json
+import os
+import sys
+from pathlib import Path
 import multiprocessing
 from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import timing
 
 try:
     from scipy.signal import convolve2d
@@ -41,6 +49,292 @@ def convolution_blocked(image, kernel, block_size=32):
 
     return output
 
+def _accumulator_dtype(image, kernel):
+    # Вещественное изображение накапливается в своём типе, целое — в общем
+    # типе с ядром; результат приводится к типу image, как в convolution_original
+    if image.dtype.kind in "fc":
+        return image.dtype
+    return np.result_type(image.dtype, kernel.dtype)
+
+def convolution_strided(image, kernel):
+    # Все окна k_h x k_w — это view над padded без копирования,
+    # свёртка с ядром одним вызовом einsum без временных массивов на пиксель
+    k_h, k_w = kernel.shape
+    pad_h, pad_w = k_h // 2, k_w // 2
+
+    padded = np.pad(image, ((pad_h, pad_h), (pad_w, pad_w)), mode="constant")
+    windows = sliding_window_view(padded, (k_h, k_w))[:image.shape[0], :image.shape[1]]
+
+    output = np.empty(image.shape, dtype=_accumulator_dtype(image, kernel))
+    np.einsum("ijkl,kl->ij", windows, kernel, out=output, casting="same_kind")
+    return output.astype(image.dtype, copy=False)
+
+def convolution_tiled(image, kernel, tile_shape=None):
+    # Каждая плитка вместе с ореолом k - 1 считается одной векторной
+    # операцией, чтобы окна плитки помещались в кэш
+    height, width = image.shape
+    k_h, k_w = kernel.shape
+    pad_h, pad_w = k_h // 2, k_w // 2
+
+    if tile_shape is None:
+        tile_shape = autotune_tile_shape(image.shape, kernel.shape, image.dtype)
+    t_h, t_w = tile_shape
+
+    padded = np.pad(image, ((pad_h, pad_h), (pad_w, pad_w)), mode="constant")
+    output = np.empty_like(image)
+
+    for ii in range(0, height, t_h):
+        for jj in range(0, width, t_w):
+            i1, j1 = min(ii + t_h, height), min(jj + t_w, width)
+            block = padded[ii:i1 + k_h - 1, jj:j1 + k_w - 1]
+            windows = sliding_window_view(block, (k_h, k_w))[:i1 - ii, :j1 - jj]
+            output[ii:i1, jj:j1] = np.einsum("ijkl,kl->ij", windows, kernel)
+
+    return output
+
+TILE_CANDIDATES = [(16, 16), (32, 32), (64, 64), (128, 128), (32, 256), (64, 512), (256, 256)]
+TILE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "convolution_tiles.json")
+
+def _load_tile_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def autotune_tile_shape(image_shape, kernel_shape, dtype=np.float64,
+                        candidates=TILE_CANDIDATES, repeats=3, cache_path=TILE_CACHE_PATH):
+    # Перебор размеров плитки на этой машине, победитель запоминается на диске
+    # для пары (размер изображения, размер ядра, dtype)
+    dtype = np.dtype(dtype)
+    key = f"{image_shape[0]}x{image_shape[1]}|{kernel_shape[0]}x{kernel_shape[1]}|{dtype.name}"
+
+    cache = _load_tile_cache(cache_path)
+    if key in cache:
+        return tuple(cache[key])
+
+    image = np.random.rand(*image_shape).astype(dtype)
+    kernel = np.random.rand(*kernel_shape).astype(dtype)
+
+    best_shape, best_time = None, float("inf")
+    for shape in candidates:
+        shape = (min(shape[0], image_shape[0]), min(shape[1], image_shape[1]))
+        for _ in range(repeats):
+            _, dt = measure(convolution_tiled, image, kernel, shape)
+            if dt < best_time:
+                best_shape, best_time = shape, dt
+
+    cache = _load_tile_cache(cache_path)
+    cache[key] = list(best_shape)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+
+    return best_shape
+
+def convolution_taps(image, kernel):
+    # Сдвиг-и-накопление: цикл только по k_h * k_w коэффициентам ядра,
+    # каждый шаг — одна операция над всем изображением
+    height, width = image.shape
+    k_h, k_w = kernel.shape
+    pad_h, pad_w = k_h // 2, k_w // 2
+
+    padded = np.pad(image, ((pad_h, pad_h), (pad_w, pad_w)), mode="constant")
+    output = np.zeros(image.shape, dtype=_accumulator_dtype(image, kernel))
+    scratch = np.empty_like(output)
+
+    for di in range(k_h):
+        for dj in range(k_w):
+            np.multiply(padded[di:di + height, dj:dj + width], kernel[di, dj], out=scratch)
+            output += scratch
+
+    return output.astype(image.dtype, copy=False)
+
+def _correlate1d_zero(arr, k, axis):
+    # 1D-проход с нулевым дополнением, накопление по отводам ядра
+    n = len(k)
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (n // 2, n // 2)
+    padded = np.pad(arr, pad, mode="constant")
+
+    length = arr.shape[axis]
+    output = np.zeros_like(arr)
+    for t in range(n):
+        if axis == 0:
+            output += k[t] * padded[t:t + length, :]
+        else:
+            output += k[t] * padded[:, t:t + length]
+    return output
+
+def separable_decomposition(kernel, tol=1e-10):
+    # SVD ядра: kernel ~ sum(s_r * u_r (x) v_r), отбрасываем s_r <= tol * s_0
+    u, s, vt = np.linalg.svd(kernel)
+    rank = int(np.sum(s > tol * s[0])) if s[0] > 0 else 0
+    return [(u[:, r] * s[r], vt[r, :]) for r in range(rank)]
+
+def convolution_separable(image, kernel, tol=1e-10):
+    # Для ранга r: r * (k_h + k_w) умножений на пиксель вместо k_h * k_w,
+    # если выигрыша нет — обычная 2D-свёртка
+    k_h, k_w = kernel.shape
+    terms = separable_decomposition(kernel, tol)
+
+    if len(terms) * (k_h + k_w) >= k_h * k_w:
+        return convolution_taps(image, kernel)
+
+    work = image.astype(_accumulator_dtype(image, kernel), copy=False)
+    output = np.zeros_like(work)
+    for col, row in terms:
+        tmp = _correlate1d_zero(work, row, axis=1)
+        output += _correlate1d_zero(tmp, col, axis=0)
+    return output.astype(image.dtype, copy=False)
+
+def _next_fast_len(n):
+    # ближайшая сверху длина вида 2^a * 3^b * 5^c — на них FFT быстрее всего
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return n
+        n += 1
+
+def _crop_same(full, image_shape, kernel_shape):
+    # из полной линейной свёртки вырезаем "same"-часть,
+    # совпадающую с convolution_original (включая чётные ядра)
+    off_h = kernel_shape[0] - 1 - kernel_shape[0] // 2
+    off_w = kernel_shape[1] - 1 - kernel_shape[1] // 2
+    return full[off_h:off_h + image_shape[0], off_w:off_w + image_shape[1]]
+
+def convolution_fft(image, kernel):
+    # convolution_original — это корреляция, поэтому ядро переворачиваем
+    height, width = image.shape
+    k_h, k_w = kernel.shape
+    full_shape = (height + k_h - 1, width + k_w - 1)
+    fft_shape = (_next_fast_len(full_shape[0]), _next_fast_len(full_shape[1]))
+
+    spectrum = np.fft.rfft2(image, fft_shape) * np.fft.rfft2(kernel[::-1, ::-1], fft_shape)
+    full = np.fft.irfft2(spectrum, fft_shape)[:full_shape[0], :full_shape[1]]
+
+    return _crop_same(full, image.shape, kernel.shape).astype(image.dtype)
+
+def convolution_overlap_add(image, kernel, tile_size=None):
+    # Overlap-add: изображение режется на плитки, спектр ядра считается
+    # один раз, свёртки плиток складываются с перекрытием k - 1
+    height, width = image.shape
+    k_h, k_w = kernel.shape
+
+    if tile_size is None:
+        tile_size = max(64, 4 * max(k_h, k_w))
+
+    fft_shape = (_next_fast_len(tile_size + k_h - 1), _next_fast_len(tile_size + k_w - 1))
+    kernel_spec = np.fft.rfft2(kernel[::-1, ::-1], fft_shape)
+
+    full = np.zeros((height + k_h - 1, width + k_w - 1))
+    for ii in range(0, height, tile_size):
+        for jj in range(0, width, tile_size):
+            tile = image[ii:ii + tile_size, jj:jj + tile_size]
+            t_h, t_w = tile.shape
+
+            block = np.fft.irfft2(np.fft.rfft2(tile, fft_shape) * kernel_spec, fft_shape)
+            full[ii:ii + t_h + k_h - 1, jj:jj + t_w + k_w - 1] += block[:t_h + k_h - 1, :t_w + k_w - 1]
+
+    return _crop_same(full, image.shape, kernel.shape).astype(image.dtype)
+
+# Относительные стоимости одной операции каждого метода, подобраны по замерам
+# convolution_taps и convolution_fft на 512x512 (float64)
+# (умножение-сложение в NumPy-проходе и "бабочка" FFT)
+COST_DIRECT = 1.0
+COST_FFT = 0.3
+
+def choose_convolution_method(image_shape, kernel_shape, kernel=None, tol=1e-10):
+    height, width = image_shape
+    k_h, k_w = kernel_shape
+    pixels = height * width
+
+    costs = {"direct": COST_DIRECT * pixels * k_h * k_w}
+
+    if kernel is not None:
+        rank = len(separable_decomposition(kernel, tol))
+        costs["separable"] = COST_DIRECT * pixels * rank * (k_h + k_w)
+
+    # три преобразования (изображение, ядро, обратное) размера N log2 N
+    n = _next_fast_len(height + k_h - 1) * _next_fast_len(width + k_w - 1)
+    costs["fft"] = COST_FFT * 3 * n * np.log2(n)
+
+    return min(costs, key=costs.get)
+
+def convolution_auto(image, kernel):
+    method = choose_convolution_method(image.shape, kernel.shape, kernel)
+    if method == "fft":
+        return convolution_fft(image, kernel)
+    if method == "separable":
+        return convolution_separable(image, kernel)
+    return convolution_taps(image, kernel)
+
+BATCH_CHUNK_BYTES = 1 << 18
+
+def convolution_batch(images, kernels):
+    # Стек (N, H, W) и одно ядро (k_h, k_w) или своё ядро на каждое
+    # изображение (N, k_h, k_w): проход по отводам идёт сразу по группе
+    # изображений, группа подбирается так, чтобы помещаться в кэш
+    images = np.asarray(images)
+    kernels = np.asarray(kernels)
+    n, height, width = images.shape
+    k_h, k_w = kernels.shape[-2:]
+    pad_h, pad_w = k_h // 2, k_w // 2
+
+    output = np.zeros(images.shape, dtype=_accumulator_dtype(images, kernels))
+    group = max(1, BATCH_CHUNK_BYTES // max(1, height * width * output.itemsize))
+
+    for g0 in range(0, n, group):
+        g1 = min(g0 + group, n)
+        padded = np.pad(images[g0:g1], ((0, 0), (pad_h, pad_h), (pad_w, pad_w)), mode="constant")
+        out = output[g0:g1]
+        scratch = np.empty_like(out)
+
+        for di in range(k_h):
+            for dj in range(k_w):
+                window = padded[:, di:di + height, dj:dj + width]
+                if kernels.ndim == 2:
+                    np.multiply(window, kernels[di, dj], out=scratch)
+                else:
+                    np.multiply(window, kernels[g0:g1, di, dj, None, None], out=scratch)
+                out += scratch
+
+    return output.astype(images.dtype, copy=False)
+
+def _convolution_batch_worker(args):
+    start, images, kernels = args
+    return start, convolution_batch(images, kernels)
+
+def convolution_batch_parallel(images, kernels, num_workers=None, executor=None):
+    # Пакет делится по индексу изображения, каждому процессу — свой кусок стека
+    images = np.asarray(images)
+    kernels = np.asarray(kernels)
+    n = images.shape[0]
+
+    workers = num_workers or multiprocessing.cpu_count()
+    chunk = max(1, -(-n // workers))
+
+    tasks = [
+        (start, images[start:start + chunk],
+         kernels if kernels.ndim == 2 else kernels[start:start + chunk])
+        for start in range(0, n, chunk)
+    ]
+
+    output = np.empty_like(images)
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_convolution_batch_worker, tasks))
+    else:
+        results = list(executor.map(_convolution_batch_worker, tasks))
+
+    for start, block in results:
+        output[start:start + block.shape[0]] = block
+
+    return output
+
 def _convolution_worker(args):
     padded, kernel, row_range, width, k_h, k_w = args
     out = np.zeros((len(row_range), width))
@@ -75,16 +369,85 @@ def convolution_parallel(image, kernel, num_workers=None):
 
     return output
 
+def _convolution_shm_worker(args):
+    pad_name, pad_shape, out_name, out_shape, dtype, out_dtype, kernel, start, end = args
+    k_h, k_w = kernel.shape
+    width = out_shape[1]
+
+    pad_shm = shared_memory.SharedMemory(name=pad_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        padded = np.ndarray(pad_shape, dtype=dtype, buffer=pad_shm.buf)
+        output = np.ndarray(out_shape, dtype=out_dtype, buffer=out_shm.buf)
+
+        # полоса строк считается накоплением по отводам прямо в output
+        band = output[start:end]
+        band[:] = 0
+        for di in range(k_h):
+            for dj in range(k_w):
+                band += kernel[di, dj] * padded[start + di:end + di, dj:dj + width]
+
+        del padded, output, band
+    finally:
+        pad_shm.close()
+        out_shm.close()
+
+    return start, end
+
+def convolution_parallel_shared(image, kernel, num_workers=None, executor=None):
+    # padded и output лежат в shared memory, воркеры подключаются по имени
+    # и возвращают только границы полосы. executor можно передать снаружи,
+    # чтобы не поднимать процессы на каждый вызов
+    height, width = image.shape
+    k_h, k_w = kernel.shape
+    pad_h, pad_w = k_h // 2, k_w // 2
+
+    padded_src = np.pad(image, ((pad_h, pad_h), (pad_w, pad_w)), mode="constant")
+    out_dtype = _accumulator_dtype(image, kernel)
+
+    pad_shm = shared_memory.SharedMemory(create=True, size=padded_src.nbytes)
+    out_shm = shared_memory.SharedMemory(create=True, size=image.size * out_dtype.itemsize)
+    try:
+        padded = np.ndarray(padded_src.shape, dtype=image.dtype, buffer=pad_shm.buf)
+        padded[:] = padded_src
+        del padded_src
+
+        workers = num_workers or multiprocessing.cpu_count()
+        chunk = max(1, -(-height // workers))
+
+        tasks = [
+            (pad_shm.name, padded.shape, out_shm.name, image.shape, image.dtype, out_dtype,
+             kernel, start, min(start + chunk, height))
+            for start in range(0, height, chunk)
+        ]
+
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(_convolution_shm_worker, tasks))
+        else:
+            list(executor.map(_convolution_shm_worker, tasks))
+
+        output = np.ndarray(image.shape, dtype=out_dtype, buffer=out_shm.buf).astype(image.dtype)
+        del padded
+    finally:
+        pad_shm.close()
+        pad_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
+
+    return output
+
 def measure(func, *args):
-    t0 = time.perf_counter()
-    res = func(*args)
-    return res, time.perf_counter() - t0
+    return timing.measure(func, *args)
 
 
 def run_experiment():
     sizes = [(256, 256), (512, 512)]
     kernels = [3, 5, 7]
 
+    # один пул на весь эксперимент для convolution_parallel_shared
+    pool = ProcessPoolExecutor(max_workers=multiprocessing.cpu_count())
+
     for h, w in sizes:
         print(f"\n=== Image size: {h}x{w} ===")
         image = np.random.rand(h, w)
@@ -95,16 +458,65 @@ def run_experiment():
 
             _, t_orig = measure(convolution_original, image, kernel)
             _, t_block = measure(convolution_blocked, image, kernel)
+            autotune_tile_shape(image.shape, kernel.shape, image.dtype)
+            _, t_tiled = measure(convolution_tiled, image, kernel)
             _, t_par = measure(convolution_parallel, image, kernel)
+            _, t_shm = measure(convolution_parallel_shared, image, kernel, None, pool)
+            _, t_strided = measure(convolution_strided, image, kernel)
+            _, t_taps = measure(convolution_taps, image, kernel)
+            _, t_sep = measure(convolution_separable, image, kernel)
 
             print(f"Original:   {t_orig:.4f} сек")
             print(f"Blocked:    {t_block:.4f} сек")
+            print(f"Tiled:      {t_tiled:.4f} сек")
             print(f"Parallel:   {t_par:.4f} сек")
+            print(f"Shared:     {t_shm:.4f} сек")
+            print(f"Strided:    {t_strided:.4f} сек")
+            print(f"Taps:       {t_taps:.4f} сек")
+            print(f"Separable:  {t_sep:.4f} сек")
 
             if SCIPY_AVAILABLE:
                 _, t_scipy = measure(convolve2d, image, kernel, "same")
                 print(f"SciPy:      {t_scipy:.4f} сек")
 
+    # Большие ядра: прямые методы проигрывают FFT
+    for h, w in sizes:
+        print(f"\n=== Large kernels, image size: {h}x{w} ===")
+        image = np.random.rand(h, w)
+
+        for k in [15, 31, 63]:
+            kernel = np.random.rand(k, k)
+            method = choose_convolution_method(image.shape, kernel.shape, kernel)
+            print(f"\nKernel size: {k}x{k} (auto -> {method})")
+
+            ref, t_taps = measure(convolution_taps, image, kernel)
+            res_fft, t_fft = measure(convolution_fft, image, kernel)
+            res_ola, t_ola = measure(convolution_overlap_add, image, kernel)
+            _, t_auto = measure(convolution_auto, image, kernel)
+
+            print(f"Taps:       {t_taps:.4f} сек")
+            print(f"FFT:        {t_fft:.4f} сек | совпадение: {np.allclose(ref, res_fft)}")
+            print(f"OLA:        {t_ola:.4f} сек | совпадение: {np.allclose(ref, res_ola)}")
+            print(f"Auto:       {t_auto:.4f} сек")
+
+    # Пакет маленьких патчей: накладные расходы на вызов важнее самой свёртки
+    print("\n=== Batch: 2000 x 64x64, kernel 5x5 ===")
+    patches = np.random.rand(2000, 64, 64)
+    kernel = np.random.rand(5, 5)
+
+    def per_image():
+        return np.stack([convolution_taps(p, kernel) for p in patches])
+
+    ref, t_loop = measure(per_image)
+    res_batch, t_batch = measure(convolution_batch, patches, kernel)
+    res_bpar, t_bpar = measure(convolution_batch_parallel, patches, kernel, None, pool)
+
+    print(f"Loop:       {t_loop:.4f} сек")
+    print(f"Batch:      {t_batch:.4f} сек | совпадение: {np.allclose(ref, res_batch)}")
+    print(f"Batch par:  {t_bpar:.4f} сек | совпадение: {np.allclose(ref, res_bpar)}")
+
+    pool.shutdown()
+
 
 if __name__ == "__main__":
     run_experiment()
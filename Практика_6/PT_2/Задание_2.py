@@ -1,9 +1,13 @@
 import numpy as np
-import time
+import sys
+from pathlib import Path
 from concurrent.futures import ProcessPoolExecutor
 import multiprocessing
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import timing
+
 
 # -------------------------------
 # Функция для параллельного запуска
@@ -45,17 +49,11 @@ def run_experiment():
     times = {}
 
     # Последовательно
-    t0 = time.perf_counter()
-    sequential_processing(matrices)
-    t1 = time.perf_counter()
-    times[1] = t1 - t0
+    _, times[1] = timing.measure(sequential_processing, matrices)
 
     # Параллельно
     for workers in [2, 4, 8]:
-        t0 = time.perf_counter()
-        parallel_processing(matrices, workers)
-        t1 = time.perf_counter()
-        times[workers] = t1 - t0
+        _, times[workers] = timing.measure(parallel_processing, matrices, workers)
 
     return times
 
@@ -1,4 +1,9 @@
 import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from loop_vectorizer import vectorize_loop
 
 class AdvancedLoopOptimizer:
     def __init__(self):
@@ -40,6 +45,14 @@ class AdvancedLoopOptimizer:
             return 'Flow'
         return 'Independent'
 
+    def compile_loop(self, code_string):
+        # Цикл, в котором все зависимости Independent, компилируется
+        # в NumPy-срезы; при зависимостях возвращается None
+        dependencies = self.analyze_loop(code_string)
+        if any(dep['type'] != 'Independent' for dep in dependencies):
+            return None
+        return vectorize_loop(code_string)
+
     def generate_parallel_code(self, strategy='distribution'):
         if strategy == 'distribution':
             return (
@@ -86,6 +99,21 @@ for i in range(1, n):
     print("\n=== Альтернативная стратегия ===")
     print(optimizer.generate_parallel_code(strategy='tiling'))
 
+    print("\n=== Компиляция цикла ===")
+    print(f"Цикл с зависимостью: {optimizer.compile_loop(code)}")
+    independent = """
+for i in range(1, n):
+    for j in range(1, m):
+        c[i][j] = a[i][j] * b[i][j]
+"""
+    compiled = optimizer.compile_loop(independent)
+    print(f"Независимый цикл векторизован: {compiled.vectorized}")
+    a = [[i + j for j in range(4)] for i in range(3)]
+    b = [[i * j for j in range(4)] for i in range(3)]
+    c = [[0] * 4 for _ in range(3)]
+    compiled(n=3, m=4, a=a, b=b, c=c)
+    print(f"c = {c}")
+
     print("\n=== Бенчмаркинг (концептуальный) ===")
     benchmark = optimizer.benchmark_strategies()
     for k, v in benchmark.items():
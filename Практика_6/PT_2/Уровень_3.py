@@ -1,12 +1,40 @@
+import math
+from functools import lru_cache
+
 import numpy as np
 
-def non_local_means_denoising(image, search_window=3, patch_size=3, h=10.0):
+# Таблица весов exp(-x), x = d^2 / h^2, на равномерной сетке [0, LUT_X_MAX].
+# Индекс берётся округлением к ближайшему узлу, поэтому ошибка веса
+# не превышает max(LUT_X_MAX / (2 * (size - 1)), exp(-LUT_X_MAX)) плюс
+# округление float32 (~6e-8). Для size = 65536 это ~1.2e-4.
+LUT_X_MAX = 16.0
+
+
+@lru_cache(maxsize=16)
+def make_weight_lut(size=65536, dtype=np.float32):
+    x = np.linspace(0.0, LUT_X_MAX, size)
+    return np.exp(-x).astype(dtype)
+
+
+def weight_lut_max_error(size=65536):
+    return max(LUT_X_MAX / (2 * (size - 1)), math.exp(-LUT_X_MAX))
+
+
+def non_local_means_denoising(image, search_window=3, patch_size=3, h=10.0,
+                              dtype=None, lut_size=None):
     height, width = image.shape
     pad_s = search_window // 2
     pad_p = patch_size // 2
 
+    if dtype is not None:
+        image = np.asarray(image, dtype=dtype)
+
     padded = np.pad(image, pad_s + pad_p, mode='reflect')
-    output = np.zeros_like(image, dtype=float)
+    output = np.zeros_like(image, dtype=dtype or float)
+
+    if lut_size is not None:
+        lut = make_weight_lut(lut_size, padded.dtype)
+        lut_scale = (lut_size - 1) / (LUT_X_MAX * h * h)
 
     for i in range(height):
         for j in range(width):
@@ -32,7 +60,10 @@ def non_local_means_denoising(image, search_window=3, patch_size=3, h=10.0):
                     ]
 
                     dist2 = np.sum((ref_patch - patch) ** 2)
-                    w = np.exp(-dist2 / (h * h))
+                    if lut_size is None:
+                        w = np.exp(-dist2 / (h * h))
+                    else:
+                        w = lut[min(int(dist2 * lut_scale + 0.5), lut_size - 1)]
 
                     w_sum += w
                     pixel_sum += w * padded[ii, jj]
@@ -45,13 +76,18 @@ from concurrent.futures import ProcessPoolExecutor
 import os
 
 def _nlm_worker(args):
-    image, i, j, search_window, patch_size, h = args
+    image, i, j, search_window, patch_size, h, lut_size = args
     height, width = image.shape
 
     pad_s = search_window // 2
     pad_p = patch_size // 2
     padded = np.pad(image, pad_s + pad_p, mode='reflect')
 
+    if lut_size is not None:
+        # таблица строится один раз на процесс (lru_cache), а не передаётся
+        lut = make_weight_lut(lut_size, padded.dtype)
+        lut_scale = (lut_size - 1) / (LUT_X_MAX * h * h)
+
     i0 = i + pad_s + pad_p
     j0 = j + pad_s + pad_p
 
@@ -74,7 +110,10 @@ def _nlm_worker(args):
             ]
 
             dist2 = np.sum((ref_patch - patch) ** 2)
-            w = np.exp(-dist2 / (h * h))
+            if lut_size is None:
+                w = np.exp(-dist2 / (h * h))
+            else:
+                w = lut[min(int(dist2 * lut_scale + 0.5), lut_size - 1)]
 
             w_sum += w
             pixel_sum += w * padded[ii, jj]
@@ -82,12 +121,17 @@ def _nlm_worker(args):
     return i, j, pixel_sum / w_sum
 
 
-def non_local_means_parallel(image, search_window=3, patch_size=3, h=10.0, workers=4):
+def non_local_means_parallel(image, search_window=3, patch_size=3, h=10.0, workers=4,
+                             dtype=None, lut_size=None):
     height, width = image.shape
-    output = np.zeros_like(image, dtype=float)
+
+    if dtype is not None:
+        image = np.asarray(image, dtype=dtype)
+
+    output = np.zeros_like(image, dtype=dtype or float)
 
     tasks = [
-        (image, i, j, search_window, patch_size, h)
+        (image, i, j, search_window, patch_size, h, lut_size)
         for i in range(height)
         for j in range(width)
     ]
@@ -98,25 +142,300 @@ def non_local_means_parallel(image, search_window=3, patch_size=3, h=10.0, worke
 
     return output
 
-import time
+from multiprocessing import shared_memory
+
+def _nlm_tile(padded, output, rows, cols, search_window, patch_size, h,
+              lut_size=None):
+    # Тот же расчёт, что и в non_local_means_denoising, но только для
+    # одной плитки и поверх уже готового padded
+    pad_s = search_window // 2
+    pad_p = patch_size // 2
+
+    if lut_size is not None:
+        lut = make_weight_lut(lut_size, padded.dtype)
+        lut_scale = (lut_size - 1) / (LUT_X_MAX * h * h)
+
+    for i in range(*rows):
+        for j in range(*cols):
+            i0 = i + pad_s + pad_p
+            j0 = j + pad_s + pad_p
+
+            ref_patch = padded[
+                i0 - pad_p:i0 + pad_p + 1,
+                j0 - pad_p:j0 + pad_p + 1
+            ]
+
+            w_sum = 0.0
+            pixel_sum = 0.0
+
+            for di in range(-pad_s, pad_s + 1):
+                for dj in range(-pad_s, pad_s + 1):
+                    ii = i0 + di
+                    jj = j0 + dj
+
+                    patch = padded[
+                        ii - pad_p:ii + pad_p + 1,
+                        jj - pad_p:jj + pad_p + 1
+                    ]
+
+                    dist2 = np.sum((ref_patch - patch) ** 2)
+                    if lut_size is None:
+                        w = np.exp(-dist2 / (h * h))
+                    else:
+                        w = lut[min(int(dist2 * lut_scale + 0.5), lut_size - 1)]
+
+                    w_sum += w
+                    pixel_sum += w * padded[ii, jj]
+
+            output[i, j] = pixel_sum / w_sum
+
+
+def _box_sum(arr, size):
+    # Сумма по всем окнам size x size через таблицу сумм (summed-area table).
+    # Таблица копится в float64: накопленная по кадру сумма во float32
+    # теряет младшие разряды, и разности соседних углов становятся неточными
+    sat = np.zeros((arr.shape[0] + 1, arr.shape[1] + 1), dtype=np.float64)
+    np.cumsum(arr, axis=0, dtype=np.float64, out=sat[1:, 1:])
+    np.cumsum(sat[1:, 1:], axis=1, out=sat[1:, 1:])
+    return (sat[size:, size:] - sat[:-size, size:]
+            - sat[size:, :-size] + sat[:-size, :-size]).astype(arr.dtype, copy=False)
+
+
+def _nlm_tile_vectorized(padded, output, rows, cols, search_window, patch_size, h,
+                         lut_size=None):
+    # Цикл только по смещениям (di, dj): для каждого сдвига разность
+    # считается сразу для всей плитки, а расстояния между патчами
+    # берутся из таблицы сумм — O(S^2) проходов NumPy вместо O(H*W*S^2*P^2)
+    pad_s = search_window // 2
+    pad_p = patch_size // 2
+    (r0, r1), (c0, c1) = rows, cols
+
+    # область padded, покрывающая все опорные патчи плитки
+    ref = padded[r0 + pad_s:r1 + pad_s + 2 * pad_p,
+                 c0 + pad_s:c1 + pad_s + 2 * pad_p]
+
+    w_sum = np.zeros((r1 - r0, c1 - c0), dtype=padded.dtype)
+    pixel_sum = np.zeros_like(w_sum)
+
+    if lut_size is not None:
+        lut = make_weight_lut(lut_size, padded.dtype)
+        lut_scale = (lut_size - 1) / (LUT_X_MAX * h * h)
+
+    for di in range(-pad_s, pad_s + 1):
+        for dj in range(-pad_s, pad_s + 1):
+            shifted = padded[r0 + pad_s + di:r1 + pad_s + 2 * pad_p + di,
+                             c0 + pad_s + dj:c1 + pad_s + 2 * pad_p + dj]
+
+            # патч — 2 * pad_p + 1 пикселей, как в скалярной версии
+            # (для чётного patch_size это не patch_size)
+            dist2 = _box_sum((ref - shifted) ** 2, 2 * pad_p + 1)
+            if lut_size is None:
+                w = np.exp(-dist2 / (h * h))
+            else:
+                idx = (dist2 * lut_scale + 0.5).astype(np.intp)
+                w = lut[np.minimum(idx, lut_size - 1)]
+
+            w_sum += w
+            pixel_sum += w * shifted[pad_p:pad_p + r1 - r0, pad_p:pad_p + c1 - c0]
+
+    output[r0:r1, c0:c1] = pixel_sum / w_sum
+
+
+def non_local_means_vectorized(image, search_window=3, patch_size=3, h=10.0,
+                               dtype=np.float64, lut_size=None):
+    height, width = image.shape
+    pad_s = search_window // 2
+    pad_p = patch_size // 2
+
+    padded = np.pad(np.asarray(image, dtype=dtype),
+                    pad_s + pad_p, mode='reflect')
+    output = np.zeros((height, width), dtype=dtype)
+
+    _nlm_tile_vectorized(padded, output, (0, height), (0, width),
+                         search_window, patch_size, h, lut_size)
+    return output
+
+
+def _nlm_shm_worker(args):
+    (pad_name, pad_shape, out_name, out_shape, dtype,
+     rows, cols, search_window, patch_size, h, vectorized, lut_size) = args
+
+    pad_shm = shared_memory.SharedMemory(name=pad_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        padded = np.ndarray(pad_shape, dtype=dtype, buffer=pad_shm.buf)
+        output = np.ndarray(out_shape, dtype=dtype, buffer=out_shm.buf)
+        tile_fn = _nlm_tile_vectorized if vectorized else _nlm_tile
+        tile_fn(padded, output, rows, cols, search_window, patch_size, h, lut_size)
+        # view-массивы нужно отпустить до close(), иначе BufferError
+        del padded, output
+    finally:
+        pad_shm.close()
+        out_shm.close()
+
+    return rows, cols
+
+
+def _split_tiles(height, width, tile_shape):
+    tile_h, tile_w = tile_shape
+    return [
+        ((r, min(r + tile_h, height)), (c, min(c + tile_w, width)))
+        for r in range(0, height, tile_h)
+        for c in range(0, width, tile_w)
+    ]
+
+
+def non_local_means_shared(image, search_window=3, patch_size=3, h=10.0,
+                           workers=4, tile_shape=None, vectorized=False,
+                           dtype=np.float64, lut_size=None):
+    # padded строится один раз и лежит в shared memory, воркеры получают
+    # только имя блока и границы своей плитки, результат пишут сразу в output
+    height, width = image.shape
+    pad_s = search_window // 2
+    pad_p = patch_size // 2
+
+    if tile_shape is None:
+        # полосы строк на всю ширину, по несколько на процесс для балансировки
+        band = max(1, -(-height // (workers * 4)))
+        tile_shape = (band, width)
+
+    dtype = np.dtype(dtype)
+    padded_src = np.pad(np.asarray(image, dtype=dtype),
+                        pad_s + pad_p, mode='reflect')
+
+    pad_shm = shared_memory.SharedMemory(create=True, size=padded_src.nbytes)
+    out_shm = shared_memory.SharedMemory(create=True,
+                                         size=height * width * dtype.itemsize)
+    try:
+        padded = np.ndarray(padded_src.shape, dtype=dtype, buffer=pad_shm.buf)
+        padded[:] = padded_src
+        del padded_src
+
+        tasks = [
+            (pad_shm.name, padded.shape, out_shm.name, (height, width), dtype,
+             rows, cols, search_window, patch_size, h, vectorized, lut_size)
+            for rows, cols in _split_tiles(height, width, tile_shape)
+        ]
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(_nlm_shm_worker, tasks):
+                pass
+
+        output = np.ndarray((height, width), dtype=dtype,
+                            buffer=out_shm.buf).copy()
+        del padded
+    finally:
+        pad_shm.close()
+        pad_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
+
+    return output
+
+def _reflect_index(start, stop, size):
+    # номера строк (столбцов) исходного изображения для padded с start по
+    # stop, та же схема, что у np.pad(mode='reflect'): отражение периодично
+    # с периодом 2 * (size - 1), поэтому ореол может быть больше размера
+    idx = np.arange(start, stop)
+    if size == 1:
+        return np.zeros_like(idx)
+    period = 2 * (size - 1)
+    idx = np.mod(idx, period)
+    return np.where(idx >= size, period - idx, idx)
+
+
+# Бюджет памяти потоковой обработки на одну плитку с ореолом
+NLM_STREAM_BUDGET = 64 << 20
+
+
+def _stream_tile_shape(height, width, halo, itemsize, band_rows=None,
+                       memory_budget=NLM_STREAM_BUDGET):
+    # _nlm_tile_vectorized держит около 8 буферов размера плитки с ореолом
+    # в типе вычислений и таблицу сумм во float64. Плитка берётся
+    # квадратной под бюджет, на узком изображении — на всю ширину, а
+    # оставшийся бюджет уходит в строки; band_rows задаёт строки явно
+    pixels = max(1, memory_budget // (8 * itemsize + 8))
+    if band_rows is None:
+        cols = min(width, max(1, math.isqrt(pixels) - 2 * halo))
+        rows = min(height, max(1, pixels // (cols + 2 * halo) - 2 * halo))
+    else:
+        rows = min(height, band_rows)
+        cols = min(width, max(1, pixels // (rows + 2 * halo) - 2 * halo))
+    return rows, cols
+
+
+def non_local_means_streaming(image, output, search_window=3, patch_size=3,
+                              h=10.0, band_rows=None, vectorized=True,
+                              dtype=np.float64, lut_size=None,
+                              memory_budget=NLM_STREAM_BUDGET):
+    # Потоковая обработка: image и output могут быть np.memmap, в памяти
+    # одновременно находится только одна плитка с ореолом. Размер плитки
+    # выводится из memory_budget, поэтому пик памяти не зависит ни от
+    # высоты, ни от ширины изображения
+    height, width = image.shape
+    halo = search_window // 2 + patch_size // 2
+    tile_fn = _nlm_tile_vectorized if vectorized else _nlm_tile
+    tile_rows, tile_cols = _stream_tile_shape(height, width, halo,
+                                              np.dtype(dtype).itemsize,
+                                              band_rows, memory_budget)
+
+    for r0 in range(0, height, tile_rows):
+        r1 = min(r0 + tile_rows, height)
+        row_idx = _reflect_index(r0 - halo, r1 + halo, height)
+
+        for c0 in range(0, width, tile_cols):
+            c1 = min(c0 + tile_cols, width)
+            col_idx = _reflect_index(c0 - halo, c1 + halo, width)
+
+            # np.ix_ читает из memmap только элементы плитки
+            tile = np.asarray(image[np.ix_(row_idx, col_idx)], dtype=dtype)
+            tile_out = np.zeros((r1 - r0, c1 - c0), dtype=dtype)
+            tile_fn(tile, tile_out, (0, r1 - r0), (0, c1 - c0),
+                    search_window, patch_size, h, lut_size)
+
+            output[r0:r1, c0:c1] = tile_out
+            del tile, tile_out
+
+    if isinstance(output, np.memmap):
+        output.flush()
+
+    return output
+
+
+def non_local_means_memmap(src_path, dst_path, shape, dtype=np.float64,
+                           search_window=3, patch_size=3, h=10.0, band_rows=None,
+                           vectorized=True, compute_dtype=np.float64,
+                           out_dtype=None, lut_size=None,
+                           memory_budget=NLM_STREAM_BUDGET):
+    # dtype — тип исходного файла, compute_dtype — тип вычислений,
+    # out_dtype — тип выходного файла (по умолчанию compute_dtype)
+    src = np.memmap(src_path, dtype=dtype, mode='r', shape=shape)
+    dst = np.memmap(dst_path, dtype=out_dtype or compute_dtype, mode='w+', shape=shape)
+
+    non_local_means_streaming(src, dst, search_window, patch_size, h, band_rows,
+                              vectorized, compute_dtype, lut_size, memory_budget)
+
+    del src, dst
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import timing
 
 def benchmark_nlm():
+    # медианы устойчивых замеров timing.benchmark
     image = np.random.rand(64, 64)
 
-    t0 = time.time()
-    non_local_means_denoising(image)
-    t_seq = time.time() - t0
+    _, t_seq = timing.measure(non_local_means_denoising, image)
 
     results = {"sequential": t_seq}
 
     for p in [1, 2, 4, 8]:
-        t0 = time.time()
-        non_local_means_parallel(image, workers=p)
-        results[p] = time.time() - t0
+        _, results[p] = timing.measure(non_local_means_parallel, image, workers=p)
 
     return results
 
-import time
 import numpy as np
 import multiprocessing as mp
 
@@ -134,28 +453,43 @@ def run_tests():
         image = np.random.rand(*shape)
 
         # Последовательная версия
-        t0 = time.time()
-        result_seq = non_local_means_denoising(
+        result_seq, t_seq = timing.measure(
+            non_local_means_denoising,
             image,
             search_window=3,
             patch_size=3,
             h=10.0
         )
-        t_seq = time.time() - t0
 
         print(f"Последовательная версия: {t_seq:.4f} сек")
 
+        # Векторизованная версия (таблицы сумм по смещениям)
+        result_vec, t_vec = timing.measure(
+            non_local_means_vectorized,
+            image,
+            search_window=3,
+            patch_size=3,
+            h=10.0
+        )
+
+        correct = np.allclose(result_seq, result_vec, atol=1e-6)
+        speedup = t_seq / t_vec if t_vec > 0 else 0.0
+        print(
+            f"Векторизованная версия: {t_vec:.4f} сек | "
+            f"Ускорение: {speedup:.2f}x | "
+            f"Корректность: {correct}"
+        )
+
         # Параллельные версии
         for workers in workers_list:
-            t0 = time.time()
-            result_par = non_local_means_parallel(
+            result_par, t_par = timing.measure(
+                non_local_means_parallel,
                 image,
                 search_window=3,
                 patch_size=3,
                 h=10.0,
                 workers=workers
             )
-            t_par = time.time() - t0
 
             # Проверка корректности
             correct = np.allclose(result_seq, result_par, atol=1e-6)
@@ -169,6 +503,27 @@ def run_tests():
                 f"Корректность: {correct}"
             )
 
+        # Плиточная версия поверх shared memory
+        for workers in workers_list:
+            result_shm, t_shm = timing.measure(
+                non_local_means_shared,
+                image,
+                search_window=3,
+                patch_size=3,
+                h=10.0,
+                workers=workers
+            )
+
+            correct = np.allclose(result_seq, result_shm, atol=1e-6)
+            speedup = t_seq / t_shm if t_shm > 0 else 0.0
+
+            print(
+                f"shared, {workers} процессов | "
+                f"Время: {t_shm:.4f} сек | "
+                f"Ускорение: {speedup:.2f}x | "
+                f"Корректность: {correct}"
+            )
+
 
 if __name__ == "__main__":
     mp.freeze_support()  # важно для PyCharm / macOS
@@ -1,5 +1,10 @@
 import ast
+import sys
 from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from loop_vectorizer import vectorize_loop
 
 
 class LoopInfo:
@@ -9,6 +14,8 @@ class LoopInfo:
         self.reads = defaultdict(list)
         self.writes = defaultdict(list)
         self.has_dependency = False
+        self.source = ""
+        self.compiled = None
 
 
 class LoopDoctor(ast.NodeVisitor):
@@ -17,12 +24,16 @@ class LoopDoctor(ast.NodeVisitor):
 
     def visit_For(self, node):
         loop = LoopInfo(node.lineno, node.end_lineno)
+        loop.source = ast.unparse(node)
 
         for child in ast.walk(node):
             if isinstance(child, ast.Assign):
                 self._handle_assign(child, loop)
 
         self._analyze_dependencies(loop)
+        if not loop.has_dependency:
+            # чистый цикл сразу компилируется в NumPy-срезы
+            loop.compiled = vectorize_loop(loop.source)
         self.loops.append(loop)
         self.generic_visit(node)
 
@@ -68,6 +79,11 @@ class LoopDoctor(ast.NodeVisitor):
                 print("Советы:")
                 print(" [✓] Отличный кандидат для объединения с соседним циклом.")
                 print(" [✓] Можно применить @jit(nopython=True).")
+                if loop.compiled.vectorized:
+                    print(" [✓] Векторизован в NumPy-срезы: loop.compiled(**переменные).")
+                else:
+                    print(f" [ ] Векторизация не удалась ({loop.compiled.reason}),"
+                          f" loop.compiled выполнит исходный цикл.")
 
             print()
 
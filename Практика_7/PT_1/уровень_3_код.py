@@ -1,8 +1,17 @@
-import time
 import math
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
 import numpy as np
 import multiprocessing as mp
 from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+import timing
 
 
 def gaussian_kernel_1d(sigma: float, radius: int | None = None) -> np.ndarray:
@@ -18,53 +27,441 @@ def gaussian_kernel_1d(sigma: float, radius: int | None = None) -> np.ndarray:
     return k
 
 
-def convolve1d_edge(arr: np.ndarray, kernel: np.ndarray, axis: int) -> np.ndarray:
+@lru_cache(maxsize=64)
+def _cached_gaussian_kernel(sigma: float, radius: int, dtype_name: str) -> np.ndarray:
+    k = gaussian_kernel_1d(sigma, radius).astype(dtype_name)
+    k.flags.writeable = False
+    return k
+
+
+def get_gaussian_kernel(sigma: float, radius: int | None = None, dtype=np.float64) -> np.ndarray:
+    # Ограниченный LRU-кэш ядер по (sigma, radius, dtype): в каждом процессе
+    # ядро для данного sigma строится один раз. Массив только для чтения
+    if sigma <= 0:
+        raise ValueError("sigma must be > 0")
+    if radius is None:
+        radius = int(math.ceil(3 * sigma))
+    return _cached_gaussian_kernel(float(sigma), int(radius), np.dtype(dtype).name)
+
+
+def convolve1d_edge(
+    arr: np.ndarray,
+    kernel: np.ndarray,
+    axis: int,
+    out: np.ndarray | None = None,
+    scratch: np.ndarray | None = None,
+    transpose: bool = False,
+) -> np.ndarray:
     arr = np.asarray(arr, dtype=np.float64)
     k = np.asarray(kernel, dtype=np.float64)
     r = len(k) // 2
 
+    if not -arr.ndim <= axis < arr.ndim:
+        raise ValueError(f"axis {axis} is out of range for {arr.ndim}D array")
+    axis %= arr.ndim
+
+    if axis != 0 and transpose:
+        # проход по оси axis как проход по оси 0 над непрерывной копией,
+        # в которой эта ось стоит первой
+        res = convolve1d_edge(np.ascontiguousarray(np.moveaxis(arr, axis, 0)), k, axis=0)
+        if out is None:
+            return np.ascontiguousarray(np.moveaxis(res, 0, axis))
+        out[...] = np.moveaxis(res, 0, axis)
+        return out
+
     pad_width = [(0, 0)] * arr.ndim
     pad_width[axis] = (r, r)
     padded = np.pad(arr, pad_width, mode="edge")
 
-    out = np.empty_like(arr, dtype=np.float64)
-
-    if axis == 0:
-        # по строкам (вертикально)
-        for i in range(arr.shape[0]):
-            window = padded[i : i + 2 * r + 1, :]
-            # (2r+1, W) * (2r+1,) -> (W,)
-            out[i, :] = (window * k[:, None]).sum(axis=0)
-    elif axis == 1:
-        # по столбцам (горизонтально)
-        for j in range(arr.shape[1]):
-            window = padded[:, j : j + 2 * r + 1]
-            out[:, j] = (window * k[None, :]).sum(axis=1)
+    if out is None:
+        out = np.empty_like(arr, dtype=np.float64)
+    if scratch is None:
+        scratch = np.empty_like(out)
+
+    # накопление по 2r+1 отводам: out = sum(k[t] * сдвиг padded на t)
+    n = arr.shape[axis]
+    index = [slice(None)] * arr.ndim
+    for t in range(2 * r + 1):
+        index[axis] = slice(t, t + n)
+        shifted = padded[tuple(index)]
+
+        if t == 0:
+            np.multiply(shifted, k[t], out=out)
+        else:
+            np.multiply(shifted, k[t], out=scratch)
+            out += scratch
+
+    return out
+
+
+def _yvv_coefficients(sigma: float) -> tuple[float, float, float, float]:
+    # Young & van Vliet (1995), рекурсивный фильтр 3-го порядка
+    if sigma < 0.5:
+        raise ValueError("recursive Gaussian requires sigma >= 0.5")
+
+    if sigma >= 2.5:
+        q = 0.98711 * sigma - 0.96330
     else:
-        raise ValueError("Only 2D arrays supported in this benchmark (axis 0 or 1).")
+        q = 3.97156 - 4.14554 * math.sqrt(1.0 - 0.26891 * sigma)
+
+    b0 = 1.57825 + 2.44413 * q + 1.4281 * q ** 2 + 0.422205 * q ** 3
+    b1 = 2.44413 * q + 2.85619 * q ** 2 + 1.26661 * q ** 3
+    b2 = -(1.4281 * q ** 2 + 1.26661 * q ** 3)
+    b3 = 0.422205 * q ** 3
+
+    B = 1.0 - (b1 + b2 + b3) / b0
+    return B, b1 / b0, b2 / b0, b3 / b0
+
+
+@lru_cache(maxsize=64)
+def _yvv_boundary_matrix(sigma: float) -> np.ndarray:
+    # Начальное состояние обратного прохода для mode="edge" (идея Triggs & Sdika):
+    # за концом сигнала вход постоянен, поэтому отклонения от него затухают
+    # линейно и [y[n], y[n+1], y[n+2]] - u = M @ [w[n-1], w[n-2], w[n-3]] - u.
+    # M находим один раз на sigma, прогоняя оба прохода для базисных состояний
+    B, a1, a2, a3 = _yvv_coefficients(sigma)
+    length = int(20 * sigma) + 100
+
+    M = np.zeros((3, 3))
+    for k in range(3):
+        state = [0.0, 0.0, 0.0]
+        state[k] = 1.0
+        p1, p2, p3 = state
+
+        e = np.empty(length)
+        for i in range(length):
+            e[i] = a1 * p1 + a2 * p2 + a3 * p3
+            p1, p2, p3 = e[i], p1, p2
+
+        d = np.empty(length)
+        p1 = p2 = p3 = 0.0
+        for i in range(length - 1, -1, -1):
+            d[i] = B * e[i] + a1 * p1 + a2 * p2 + a3 * p3
+            p1, p2, p3 = d[i], p1, p2
+
+        M[:, k] = d[:3]
+    return M
+
+
+def recursive_gaussian_1d(arr: np.ndarray, sigma: float, axis: int) -> np.ndarray:
+    # Прямой и обратный проход IIR-фильтра: число операций на отсчёт
+    # не зависит от sigma (в отличие от FIR с 6*sigma+1 отводами).
+    # Края как в mode="edge": за пределами сигнал продолжен крайним значением
+    B, a1, a2, a3 = _yvv_coefficients(sigma)
+    x = np.moveaxis(np.asarray(arr, dtype=np.float64), axis, 0)
+    n = x.shape[0]
+
+    w = np.empty_like(x)
+    p1 = p2 = p3 = x[0]
+    for i in range(n):
+        w[i] = B * x[i] + a1 * p1 + a2 * p2 + a3 * p3
+        p1, p2, p3 = w[i], p1, p2
+
+    u = x[n - 1]
+    tail = np.stack([w[max(n - 1 - t, 0)] - u for t in range(3)])
+    p1, p2, p3 = np.tensordot(_yvv_boundary_matrix(sigma), tail, axes=1) + u
+
+    y = np.empty_like(x)
+    for i in range(n - 1, -1, -1):
+        y[i] = B * w[i] + a1 * p1 + a2 * p2 + a3 * p3
+        p1, p2, p3 = y[i], p1, p2
+
+    return np.ascontiguousarray(np.moveaxis(y, 0, axis))
+
+
+def gaussian_filter_2d_numpy(image: np.ndarray, sigma: float, method: str = "fir") -> np.ndarray:
+    if method == "iir":
+        tmp = recursive_gaussian_1d(image, sigma, axis=1)  # по X
+        return recursive_gaussian_1d(tmp, sigma, axis=0)   # по Y
+    if method != "fir":
+        raise ValueError(f"unknown method: {method!r} (expected 'fir' or 'iir')")
+
+    k = get_gaussian_kernel(sigma)
+    scratch = np.empty(np.shape(image), dtype=np.float64)
+    tmp = convolve1d_edge(image, k, axis=1, scratch=scratch)  # по X
+    out = convolve1d_edge(tmp, k, axis=0, scratch=scratch)    # по Y
+    return out
+
+
+def _per_axis_sigma(sigma, ndim: int) -> list[float]:
+    if np.ndim(sigma) == 0:
+        return [float(sigma)] * ndim
+    sigmas = [float(s) for s in sigma]
+    if len(sigmas) != ndim:
+        raise ValueError(f"expected {ndim} sigmas, got {len(sigmas)}")
+    return sigmas
+
 
+def gaussian_filter_nd(arr: np.ndarray, sigma) -> np.ndarray:
+    # sigma — число или своё значение на каждую ось; sigma = 0 пропускает ось.
+    # Проходы идут с последней оси к первой, как в 2D-версии (сначала X)
+    arr = np.asarray(arr, dtype=np.float64)
+    sigmas = _per_axis_sigma(sigma, arr.ndim)
+
+    out = arr.copy()
+    scratch = np.empty_like(out)
+    tmp = np.empty_like(out)
+    for axis in reversed(range(arr.ndim)):
+        if sigmas[axis] == 0:
+            continue
+        k = get_gaussian_kernel(sigmas[axis])
+        convolve1d_edge(out, k, axis=axis, out=tmp, scratch=scratch)
+        out, tmp = tmp, out
     return out
 
 
-def gaussian_filter_2d_numpy(image: np.ndarray, sigma: float) -> np.ndarray:
-    k = gaussian_kernel_1d(sigma)
-    tmp = convolve1d_edge(image, k, axis=1)  # по X
-    out = convolve1d_edge(tmp, k, axis=0)    # по Y
+def _worker_gauss_slab(args):
+    src_name, dst_name, shape, axis, slab_axis, start, end, kernel = args
+
+    src_shm = shared_memory.SharedMemory(name=src_name)
+    dst_shm = shared_memory.SharedMemory(name=dst_name)
+    try:
+        src = np.ndarray(shape, dtype=np.float64, buffer=src_shm.buf)
+        dst = np.ndarray(shape, dtype=np.float64, buffer=dst_shm.buf)
+
+        index = [slice(None)] * len(shape)
+        index[slab_axis] = slice(start, end)
+        index = tuple(index)
+        convolve1d_edge(src[index], kernel, axis=axis, out=dst[index])
+
+        del src, dst
+    finally:
+        src_shm.close()
+        dst_shm.close()
+
+    return start, end
+
+
+def gaussian_filter_nd_parallel(arr: np.ndarray, sigma, workers: int) -> np.ndarray:
+    # Каждый проход вдоль оси axis режется на независимые слои по другой
+    # (самой длинной) оси; слои обрабатываются процессами поверх двух
+    # буферов shared memory, которые меняются местами между проходами
+    arr = np.asarray(arr, dtype=np.float64)
+    sigmas = _per_axis_sigma(sigma, arr.ndim)
+
+    if arr.ndim < 2 or arr.size == 0:
+        return gaussian_filter_nd(arr, sigmas)
+
+    shms = [shared_memory.SharedMemory(create=True, size=arr.nbytes) for _ in range(2)]
+    try:
+        src = np.ndarray(arr.shape, dtype=np.float64, buffer=shms[0].buf)
+        src[...] = arr
+        del src
+
+        cur = 0
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            for axis in reversed(range(arr.ndim)):
+                if sigmas[axis] == 0:
+                    continue
+                k = get_gaussian_kernel(sigmas[axis])
+
+                slab_axis = max((a for a in range(arr.ndim) if a != axis),
+                                key=lambda a: arr.shape[a])
+                length = arr.shape[slab_axis]
+                chunk = max(1, -(-length // workers))
+
+                tasks = [
+                    (shms[cur].name, shms[1 - cur].name, arr.shape, axis,
+                     slab_axis, start, min(start + chunk, length), k)
+                    for start in range(0, length, chunk)
+                ]
+                list(ex.map(_worker_gauss_slab, tasks))
+                cur = 1 - cur
+
+        out = np.ndarray(arr.shape, dtype=np.float64, buffer=shms[cur].buf).copy()
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
     return out
 
 
 def _worker_gauss(args):
     img, sigma = args
-    return gaussian_filter_2d_numpy(img, sigma)
+    if np.ndim(sigma) == 0:
+        return gaussian_filter_2d_numpy(img, sigma)
+    # несколько масштабов за одну задачу: (len(sigma), H, W)
+    return np.stack([gaussian_filter_2d_numpy(img, s) for s in sigma])
+
+
+# изображения от этого размера режутся на полосы всегда: ореол полосы
+# на фоне её высоты пренебрежимо мал
+SPLIT_MIN_PIXELS = 1 << 20
+
+
+def schedule_gauss_tasks(shapes, sigma, workers: int, tasks_per_worker: int = 4):
+    # Делим пакет на задачи примерно равной стоимости (стоимость ~ H*W*число
+    # масштабов): на полосы строк режутся только изображения дороже доли
+    # одного воркера или крупнее SPLIT_MIN_PIXELS (полосы несут избыточные
+    # строки ореола), остальные собираются в группы; задачи упорядочены
+    # от самой тяжёлой
+    n_scales = 1 if np.ndim(sigma) == 0 else len(sigma)
+    costs = [h * w * n_scales for h, w in shapes]
+    share = sum(costs) / workers
+    target = max(1, sum(costs) // (workers * tasks_per_worker))
+
+    units = []
+    small = []
+    for idx, ((h, w), cost) in enumerate(zip(shapes, costs)):
+        if h > 1 and (cost > share or h * w >= SPLIT_MIN_PIXELS):
+            rows = max(1, -(-target // (w * n_scales)))
+            for r0 in range(0, h, rows):
+                r1 = min(r0 + rows, h)
+                units.append(((r1 - r0) * w * n_scales, [(idx, r0, r1)]))
+        else:
+            small.append((cost, idx))
+
+    small.sort(reverse=True)
+    group, group_cost = [], 0
+    for cost, idx in small:
+        group.append((idx, 0, shapes[idx][0]))
+        group_cost += cost
+        if group_cost >= target:
+            units.append((group_cost, group))
+            group, group_cost = [], 0
+    if group:
+        units.append((group_cost, group))
+
+    units.sort(key=lambda u: u[0], reverse=True)
+    return units
+
+
+def _worker_gauss_chunk(args):
+    pieces, sigma = args
+    out = []
+    for idx, r0, r1, lo, block in pieces:
+        res = _worker_gauss((block, sigma))
+        out.append((idx, r0, r1, res[..., r0 - lo:r1 - lo, :]))
+    return out
 
 
-def gaussian_filter_batch_parallel(images: list[np.ndarray], sigma: float, workers: int) -> list[np.ndarray]:
-    # Важно: на macOS нужен __main__ guard, он ниже
+def gaussian_filter_batch_parallel(
+    images: list[np.ndarray], sigma: float | list[float], workers: int, chunked: bool = True
+) -> list[np.ndarray]:
+    # sigma может быть списком — тогда для каждого изображения возвращается
+    # стек масштабов (len(sigma), H, W), например для разности гауссиан
+    if np.ndim(sigma) != 0:
+        sigma = [float(s) for s in sigma]
+
+    if not chunked:
+        # Важно: на macOS нужен __main__ guard, он ниже
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_worker_gauss, [(img, sigma) for img in images]))
+        return results
+
+    # полоса несёт с собой ореол из radius строк, поэтому результат
+    # совпадает с обработкой изображения целиком
+    halo = max(int(math.ceil(3 * s)) for s in np.atleast_1d(sigma))
+    shapes = [np.shape(img) for img in images]
+
+    tasks = []
+    for _, unit in schedule_gauss_tasks(shapes, sigma, workers):
+        pieces = []
+        for idx, r0, r1 in unit:
+            lo, hi = max(0, r0 - halo), min(shapes[idx][0], r1 + halo)
+            pieces.append((idx, r0, r1, lo, images[idx][lo:hi]))
+        tasks.append((pieces, sigma))
+
+    results = [None] * len(images)
     with ProcessPoolExecutor(max_workers=workers) as ex:
-        results = list(ex.map(_worker_gauss, [(img, sigma) for img in images]))
+        for chunk in ex.map(_worker_gauss_chunk, tasks):
+            for idx, r0, r1, res in chunk:
+                if r0 == 0 and r1 == shapes[idx][0]:
+                    results[idx] = res
+                    continue
+                if results[idx] is None:
+                    results[idx] = np.empty(res.shape[:-2] + shapes[idx], dtype=np.float64)
+                results[idx][..., r0:r1, :] = res
     return results
 
 
+_POOLS: dict[int, ProcessPoolExecutor] = {}
+
+
+def get_gauss_pool(workers: int) -> ProcessPoolExecutor:
+    # Долгоживущий пул на каждое число процессов: повторные вызовы
+    # не платят за запуск процессов
+    pool = _POOLS.get(workers)
+    if pool is None:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        _POOLS[workers] = pool
+    return pool
+
+
+def shutdown_gauss_pools() -> None:
+    for pool in _POOLS.values():
+        pool.shutdown()
+    _POOLS.clear()
+
+
+def _worker_gauss_shared(args):
+    src_name, dst_name, src_shape, dst_shape, start, end, sigma = args
+
+    src_shm = shared_memory.SharedMemory(name=src_name)
+    dst_shm = shared_memory.SharedMemory(name=dst_name)
+    try:
+        src = np.ndarray(src_shape, dtype=np.float64, buffer=src_shm.buf)
+        dst = np.ndarray(dst_shape, dtype=np.float64, buffer=dst_shm.buf)
+
+        for i in range(start, end):
+            if np.ndim(sigma) == 0:
+                dst[i] = gaussian_filter_2d_numpy(src[i], sigma)
+            else:
+                for s_idx, s in enumerate(sigma):
+                    dst[i, s_idx] = gaussian_filter_2d_numpy(src[i], s)
+
+        del src, dst
+    finally:
+        src_shm.close()
+        dst_shm.close()
+
+    return start, end
+
+
+def gaussian_filter_batch_shared(
+    images, sigma: float | list[float], workers: int, executor: ProcessPoolExecutor | None = None
+) -> np.ndarray:
+    # Входной стек (N, H, W) и выходной стек — по одному блоку shared memory,
+    # задачи — только (диапазон индексов, sigma). Пул по умолчанию общий
+    # и живёт между вызовами (см. get_gauss_pool)
+    stack = np.asarray(images, dtype=np.float64)
+    n = stack.shape[0]
+
+    if np.ndim(sigma) == 0:
+        out_shape = stack.shape
+    else:
+        sigma = [float(s) for s in sigma]
+        out_shape = (n, len(sigma)) + stack.shape[1:]
+
+    if executor is None:
+        executor = get_gauss_pool(workers)
+
+    src_shm = shared_memory.SharedMemory(create=True, size=max(1, stack.nbytes))
+    dst_shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(out_shape)) * 8))
+    try:
+        src = np.ndarray(stack.shape, dtype=np.float64, buffer=src_shm.buf)
+        src[...] = stack
+        del src
+
+        chunk = max(1, -(-n // workers))
+        tasks = [
+            (src_shm.name, dst_shm.name, stack.shape, out_shape,
+             start, min(start + chunk, n), sigma)
+            for start in range(0, n, chunk)
+        ]
+        list(executor.map(_worker_gauss_shared, tasks))
+
+        out = np.ndarray(out_shape, dtype=np.float64, buffer=dst_shm.buf).copy()
+    finally:
+        src_shm.close()
+        src_shm.unlink()
+        dst_shm.close()
+        dst_shm.unlink()
+
+    return out
+
+
 def try_scipy_gaussian(image: np.ndarray, sigma: float):
     try:
         from scipy.ndimage import gaussian_filter
@@ -72,15 +469,16 @@ def try_scipy_gaussian(image: np.ndarray, sigma: float):
     except Exception as e:
         return None
 
+def measure_stats(fn, repeats: int = 3) -> dict:
+    # repeats — минимальное число замеров, дальше timing.benchmark сам
+    # повторяет до сужения доверительного интервала
+    stats = timing.benchmark(fn, timing_options={"min_repeats": repeats})
+    stats.pop("result")
+    return stats
+
+
 def measure_time(fn, repeats: int = 3) -> float:
-    best = float("inf")
-    for _ in range(repeats):
-        t0 = time.perf_counter()
-        fn()
-        dt = time.perf_counter() - t0
-        if dt < best:
-            best = dt
-    return best
+    return measure_stats(fn, repeats)["median"]
 
 
 def run_benchmark(
@@ -106,13 +504,36 @@ def run_benchmark(
 
         print(f"\n=== Image size: {H}x{W} ===")
 
+        # полная статистика по каждой конфигурации — для save_benchmark
+        stats = {}
+
+        # сравниваются медианы, рядом печатаются IQR и ДИ медианы
+        def timed(name, fn):
+            stats[name] = measure_stats(fn, repeats=repeats)
+            return stats[name]["median"]
+
         # Sequential batch
         def seq_run():
             for img in images:
                 gaussian_filter_2d_numpy(img, sigma)
 
-        t_seq = measure_time(seq_run, repeats=repeats)
-        print(f"Sequential (our numpy): {t_seq:.4f} sec")
+        t_seq = timed("seq", seq_run)
+        print(f"Sequential (our numpy): {timing.format_stats(stats['seq'])}")
+
+        # Рекурсивный (IIR) вариант и его точность относительно FIR
+        def iir_run():
+            for img in images:
+                gaussian_filter_2d_numpy(img, sigma, method="iir")
+
+        if sigma >= 0.5:
+            t_iir = timed("iir", iir_run)
+            iir_out = gaussian_filter_2d_numpy(images[0], sigma, method="iir")
+            fir_out = gaussian_filter_2d_numpy(images[0], sigma)
+            iir_err_fir = float(np.max(np.abs(iir_out - fir_out)))
+            print(f"Sequential IIR (Young-van Vliet): {timing.format_stats(stats['iir'])} | max|IIR-FIR|: {iir_err_fir:.2e}")
+        else:
+            t_iir = iir_out = iir_err_fir = None
+            print("Sequential IIR: SKIPPED (sigma < 0.5)")
 
         # Parallel batch
         par_times = {}
@@ -120,10 +541,22 @@ def run_benchmark(
             def par_run():
                 gaussian_filter_batch_parallel(images, sigma, workers=w)
 
-            t_par = measure_time(par_run, repeats=repeats)
+            t_par = timed(f"par_{w}", par_run)
             par_times[w] = t_par
             speedup = t_seq / t_par if t_par > 0 else float("nan")
-            print(f"Parallel workers={w}: {t_par:.4f} sec | speedup: {speedup:.2f}x")
+            print(f"Parallel workers={w}: {timing.format_stats(stats[f'par_{w}'])} | speedup: {speedup:.2f}x")
+
+        # Shared memory + долгоживущий пул
+        shm_times = {}
+        stack = np.stack(images)
+        for w in workers_list:
+            def shm_run():
+                gaussian_filter_batch_shared(stack, sigma, workers=w)
+
+            t_shm = timed(f"shm_{w}", shm_run)
+            shm_times[w] = t_shm
+            speedup = t_seq / t_shm if t_shm > 0 else float("nan")
+            print(f"Shared workers={w}:   {timing.format_stats(stats[f'shm_{w}'])} | speedup: {speedup:.2f}x")
 
         # SciPy single-image (optional)
         scipy_out = try_scipy_gaussian(images[0], sigma)
@@ -136,17 +569,104 @@ def run_benchmark(
                 for img in images:
                     gaussian_filter(img, sigma=sigma, mode="nearest")
 
-            t_scipy = measure_time(scipy_run, repeats=repeats)
-            print(f"SciPy gaussian_filter:     {t_scipy:.4f} sec (batch)")
+            t_scipy = timed("scipy", scipy_run)
+            print(f"SciPy gaussian_filter:     {timing.format_stats(stats['scipy'])} (batch)")
+
+        iir_err_scipy = None
+        if scipy_out is not None and iir_out is not None:
+            iir_err_scipy = float(np.max(np.abs(iir_out - scipy_out)))
+            fir_err_scipy = float(np.max(np.abs(fir_out - scipy_out)))
+            print(f"max|IIR-SciPy|: {iir_err_scipy:.2e} | max|FIR-SciPy|: {fir_err_scipy:.2e}")
 
         all_results[size] = {
             "t_seq": t_seq,
             "t_par": par_times,
+            "t_shm": shm_times,
             "t_scipy": t_scipy,
+            "t_iir": t_iir,
+            "iir_err_fir": iir_err_fir,
+            "iir_err_scipy": iir_err_scipy,
+            "stats": stats,
         }
 
+    shutdown_gauss_pools()
     return all_results
 
+def host_info() -> dict:
+    return {
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": mp.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def save_benchmark(results: dict, path: str = "benchmark_results.jsonl", params: dict | None = None) -> dict:
+    # Одна строка JSON на запуск: хост, версии, параметры и
+    # best/median/stdev по каждой (размер, конфигурация)
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "host": host_info(),
+        "params": params or {},
+        "results": {str(size): data["stats"] for size, data in results.items()},
+    }
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return record
+
+
+def load_benchmarks(path: str) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _significantly_slower(cur: dict, base: dict, z: float = 1.96) -> bool:
+    # Доверительные интервалы медиан не пересекаются; для записей без ДИ —
+    # z-критерий по сохранённым stdev и числу повторов
+    if "ci_low" in cur and "ci_high" in base:
+        return cur["ci_low"] > base["ci_high"]
+    se = math.sqrt(cur.get("stdev", 0.0) ** 2 / max(1, cur.get("repeats", 1))
+                   + base.get("stdev", 0.0) ** 2 / max(1, base.get("repeats", 1)))
+    return cur["median"] - base["median"] > z * se
+
+
+def compare_benchmarks(current: dict, baseline: dict, threshold: float = 0.10) -> list[dict]:
+    # Регрессия — медиана выросла больше чем на threshold относительно базы
+    # и рост статистически значим, иначе шум двух прогонов даёт ложные
+    # срабатывания. Сравниваются только конфигурации, которые есть в обоих запусках
+    rows = []
+    for size, configs in current["results"].items():
+        base_configs = baseline["results"].get(size, {})
+        for name, cur in configs.items():
+            base = base_configs.get(name)
+            if base is None or base["median"] <= 0:
+                continue
+            ratio = cur["median"] / base["median"]
+            rows.append({
+                "size": size,
+                "config": name,
+                "baseline": base["median"],
+                "current": cur["median"],
+                "ratio": ratio,
+                "regression": ratio > 1.0 + threshold and _significantly_slower(cur, base),
+            })
+    return rows
+
+
+def print_comparison(rows: list[dict], threshold: float = 0.10) -> int:
+    print(f"{'size':>6} {'config':<10} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for r in rows:
+        mark = "  REGRESSION" if r["regression"] else ""
+        print(f"{r['size']:>6} {r['config']:<10} {r['baseline']:>10.4f} "
+              f"{r['current']:>10.4f} {r['ratio']:>6.2f}x{mark}")
+
+    n_bad = sum(r["regression"] for r in rows)
+    print(f"\nРегрессий (> {threshold:.0%}, значимых): {n_bad}")
+    return n_bad
+
+
 def plot_speedup(results: dict, workers_list=(1, 2, 4, 8)):
     import matplotlib.pyplot as plt
 
@@ -169,10 +689,34 @@ def plot_speedup(results: dict, workers_list=(1, 2, 4, 8)):
 
 
 if __name__ == "__main__":
+    import argparse
+
     mp.freeze_support()
 
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command")
+
+    run_p = sub.add_parser("run", help="запустить бенчмарк (по умолчанию)")
+    run_p.add_argument("--save", default="benchmark_results.jsonl", help="куда дописать результаты")
+    run_p.add_argument("--no-plot", action="store_true")
+
+    cmp_p = sub.add_parser("compare", help="сравнить последний запуск с базой")
+    cmp_p.add_argument("baseline", help="jsonl с базовым запуском (берётся последняя запись)")
+    cmp_p.add_argument("current", nargs="?", default="benchmark_results.jsonl")
+    cmp_p.add_argument("--threshold", type=float, default=0.10)
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        rows = compare_benchmarks(
+            load_benchmarks(args.current)[-1],
+            load_benchmarks(args.baseline)[-1],
+            args.threshold,
+        )
+        sys.exit(1 if print_comparison(rows, args.threshold) else 0)
+
     # Подстрой под себя:
-    results = run_benchmark(
+    params = dict(
         img_sizes=(64, 128, 256),   # можно поставить (32, 64) чтобы было быстрее
         n_images=8,                 # увеличь до 30-100 для более «тяжёлых» замеров
         sigma=1.2,
@@ -180,5 +724,8 @@ if __name__ == "__main__":
         repeats=2,
         seed=1,
     )
+    results = run_benchmark(**params)
+    save_benchmark(results, getattr(args, "save", "benchmark_results.jsonl"), params)
 
-    plot_speedup(results, workers_list=(1, 2, 4, 8))
+    if not getattr(args, "no_plot", False):
+        plot_speedup(results, workers_list=(1, 2, 4, 8))